@@ -0,0 +1,188 @@
+import io
+import queue
+import threading
+import time
+from collections import deque
+
+import tracing
+
+class SliceReader(io.RawIOBase):
+    # Read-only file over a memoryview, lets pygame stream a fragment straight out of the mapped pack
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self.view) - self.position)
+        buffer[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+class AudioEngine:
+    # Owns pygame.mixer on its own thread; the UI only queues commands and drains events from its main loop
+    def __init__(self, volume=1.0, buffer=512, effects=None, effects_volume=0.2):
+        self.volume = volume
+        self.buffer = buffer
+        self.effect_paths = effects or {}
+        self.effects_volume = effects_volume
+        self.effects = {}
+        self.effects_channel = None
+        self.commands = queue.Queue()
+        self.events = queue.Queue()
+        self.latencies = deque(maxlen=200)
+        self.thread = None
+        self.stream = None
+        self.paused = False
+        self.output_latency = 0
+
+    def start(self):
+        # Returns right away, commands sent while pygame is still loading wait in the queue
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.commands.put(("quit", time.perf_counter(), ()))
+            self.thread.join()
+            self.thread = None
+
+    def send(self, command, *args, clicked=None):
+        # clicked is the time of the button press the command answers, used for the latency figures
+        self.commands.put((command, clicked or time.perf_counter(), args))
+
+    def load(self, data, clicked=None):
+        self.send("load", data, clicked=clicked)
+
+    def play(self, start=0, clicked=None):
+        self.send("play", start, clicked=clicked)
+
+    def pause(self, clicked=None):
+        self.send("pause", clicked=clicked)
+
+    def seek(self, position, clicked=None):
+        self.send("play", position, clicked=clicked)
+
+    def replay(self, clicked=None):
+        self.send("play", 0, clicked=clicked)
+
+    def fade(self, ms, clicked=None):
+        self.send("fade", ms, clicked=clicked)
+
+    def effect(self, name, clicked=None):
+        self.send("effect", name, clicked=clicked)
+
+    def set_volume(self, volume):
+        self.send("volume", volume)
+
+    def halt(self, clicked=None):
+        self.send("stop", clicked=clicked)
+
+    def poll(self, handle):
+        # Called on the Tk thread, hands every pending event to handle(name, value)
+        while True:
+            try:
+                name, value = self.events.get_nowait()
+            except queue.Empty:
+                return
+            handle(name, value)
+
+    def latency_stats(self):
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def run(self):
+        import pygame
+        try:
+            pygame.mixer.init(buffer=self.buffer)
+            frequency = pygame.mixer.get_init()[0]
+            # Time for a freshly started clip to get through the output buffer
+            self.output_latency = self.buffer / frequency
+            pygame.mixer.music.set_volume(self.volume)
+            # Effects are decoded once and get a reserved channel, so they play over the round's clip instead of replacing it
+            pygame.mixer.set_reserved(1)
+            self.effects_channel = pygame.mixer.Channel(0)
+            for name, path in self.effect_paths.items():
+                try:
+                    self.effects[name] = pygame.mixer.Sound(path)
+                except Exception as e:
+                    print(f"Warning: sound effect '{path}' could not be loaded: {e}")
+        except Exception as e:
+            self.events.put(("error", f"Audio device could not be opened: {e}"))
+        music = pygame.mixer.music
+        while True:
+            command, clicked, args = self.commands.get()
+            if command == "quit":
+                break
+            try:
+                with tracing.span(f"audio.{command}"):
+                    self.execute(music, command, clicked, args)
+            except Exception as e:
+                self.events.put(("error", f"{command} failed: {e}"))
+        pygame.mixer.quit()
+
+    def execute(self, music, command, clicked, args):
+        if command == "load":
+            # pygame reads from the stream while playing, so it is kept alive until the next load
+            music.stop()
+            music.set_volume(self.volume)
+            data = args[0]
+            self.stream = SliceReader(data) if isinstance(data, memoryview) else io.BytesIO(data)
+            music.load(self.stream, "mp3")
+            self.paused = False
+        elif command == "play":
+            music.play(start=args[0])
+            self.paused = False
+            self.started(music, clicked)
+        elif command == "pause":
+            if self.paused:
+                music.unpause()
+                self.paused = False
+                self.events.put(("paused", False))
+            elif music.get_busy():
+                music.pause()
+                self.paused = True
+                self.events.put(("paused", True))
+        elif command == "stop":
+            music.stop()
+            self.paused = False
+        elif command == "fade":
+            music.fadeout(args[0])
+        elif command == "effect":
+            sound = self.effects.get(args[0])
+            if sound is not None:
+                self.effects_channel.set_volume(self.volume * self.effects_volume)
+                self.effects_channel.play(sound)
+        elif command == "volume":
+            self.volume = args[0]
+            music.set_volume(self.volume)
+
+    def started(self, music, clicked):
+        # The mixer reports busy once the clip is queued, it becomes audible one output buffer later
+        deadline = time.perf_counter() + 0.2
+        while not music.get_busy() and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        latency = time.perf_counter() - clicked + self.output_latency
+        self.latencies.append(latency)
+        if tracing.enabled:
+            tracing.record("audio.click_to_audible", clicked, clicked + latency)
+        self.events.put(("started", latency))
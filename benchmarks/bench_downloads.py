@@ -0,0 +1,42 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_manager import DownloadManager
+
+FAKE_SPOTDL = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_spotdl.py")]
+
+def run(links, workers, batch_size, scratch):
+    folder = tempfile.mkdtemp(dir=scratch)
+    received = []
+    manager = DownloadManager(workers=workers, batch_size=batch_size, command=FAKE_SPOTDL,
+                              on_files=received.extend, staging_dir=os.path.join(scratch, "staging"))
+    started = time.perf_counter()
+    manager.add(links, folder)
+    while True:
+        done, total, failed, _ = manager.progress()
+        if done == total and all(job.finished for job in manager.jobs):
+            break
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    manager.stop()
+    return elapsed, len(received), manager.max_active
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures download manager throughput against a fake spotdl.")
+    parser.add_argument("--links", type=int, default=40)
+    args = parser.parse_args()
+
+    links = [f"https://open.spotify.com/track/{i:022d}" for i in range(args.links)]
+    with tempfile.TemporaryDirectory() as scratch:
+        for workers, batch_size in ((1, 1), (4, 1), (1, 10), (4, 10)):
+            elapsed, files, concurrency = run(links, workers, batch_size, scratch)
+            print(f"workers {workers}  batch {batch_size:2}:  {elapsed:6.2f} s  {files / elapsed:6.1f} songs/s  "
+                  f"{files} files  max {concurrency} concurrent jobs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library import Song
+from mp3frames import cut_file
+
+def legacy_fragment(song, output):
+    from pydub import AudioSegment
+    song_duration = AudioSegment.from_file(song.filepath).duration_seconds
+    start_time = random.randint(10, int(song_duration - 20))
+    cmd = f'ffmpeg -y -i "{song.filepath}" -ss {start_time} -to {start_time + 10} -c:a libmp3lame "{output}"'
+    subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    with open(output, "rb") as f:
+        return f.read()
+
+def frame_fragment(song):
+    start_time = random.randint(10, int(song.duration - 20))
+    return cut_file(song.filepath, start_time, 10)
+
+def measure(function, songs, rounds):
+    timings = []
+    for _ in range(rounds):
+        song = random.choice(songs)
+        started = time.perf_counter()
+        function(song)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the frame-cutting fragment path with the pydub + ffmpeg one.")
+    parser.add_argument("folder", help="folder with MP3 files")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    songs = []
+    for root, _, files in os.walk(args.folder):
+        for file in files:
+            if file.endswith(".mp3"):
+                try:
+                    song = Song(os.path.join(root, file))
+                except ValueError:
+                    continue
+                if song.duration > 30:
+                    songs.append(song)
+    if not songs:
+        print("No MP3 files longer than 30 seconds found.")
+        return
+
+    median, worst = measure(frame_fragment, songs, args.rounds)
+    print(f"frame cut:      median {median * 1000:8.2f} ms   max {worst * 1000:8.2f} ms")
+
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found, skipping the legacy path.")
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "temp.mp3")
+        median, worst = measure(lambda song: legacy_fragment(song, output), songs, args.rounds)
+    print(f"pydub + ffmpeg: median {median * 1000:8.2f} ms   max {worst * 1000:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
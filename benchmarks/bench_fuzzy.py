@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy import AnswerIndex, normalize_title
+
+WORDS = ["love", "night", "heart", "dance", "fire", "dream", "city", "light", "blue", "home",
+         "girl", "road", "rain", "star", "summer", "gold", "wild", "ocean", "ghost", "river"]
+
+def random_title(rng):
+    words = [rng.choice(WORDS) if rng.random() < 0.5 else "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+             for _ in range(rng.randint(1, 4))]
+    title = " ".join(words).title()
+    if rng.random() < 0.1:
+        title += f" (feat. {rng.choice(WORDS).title()})"
+    if rng.random() < 0.1:
+        title += " - Remastered"
+    return title
+
+def typo(rng, text):
+    if len(text) < 2:
+        return text
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+def percentiles(timings):
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures fuzzy answer checking and suggestions on a synthetic title corpus.")
+    parser.add_argument("--titles", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    titles = [random_title(rng) for _ in range(args.titles)]
+    started = time.perf_counter()
+    index = AnswerIndex(titles)
+    print(f"index build:   {(time.perf_counter() - started) * 1000:8.1f} ms for {len(titles)} titles")
+
+    check_timings = []
+    accepted = 0
+    for _ in range(args.queries):
+        title = rng.choice(titles)
+        answer = typo(rng, title.split(" - ")[0])
+        started = time.perf_counter()
+        accepted += index.is_correct(answer, normalize_title(title))
+        check_timings.append(time.perf_counter() - started)
+    median, p99 = percentiles(check_timings)
+    print(f"answer check:  p50 {median:6.3f} ms   p99 {p99:6.3f} ms   accepted {accepted}/{args.queries} one-typo answers")
+
+    suggest_timings = []
+    for _ in range(args.queries):
+        title = rng.choice(titles)
+        typed = typo(rng, title[:rng.randint(3, max(3, len(title)))])
+        started = time.perf_counter()
+        index.suggest(typed)
+        suggest_timings.append(time.perf_counter() - started)
+    median, p99 = percentiles(suggest_timings)
+    print(f"suggestions:   p50 {median:6.3f} ms   p99 {p99:6.3f} ms")
+
+if __name__ == "__main__":
+    main()
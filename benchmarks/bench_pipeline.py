@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fragment import SongFragment
+from fragment_cache import FragmentCache
+from library import SongLibrary, SongTable
+from rounds import RoundBuilder
+from song_index import SongIndex
+from synthetic import generate_library
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return {"p50_ms": round(timings[len(timings) // 2] * 1000, 4),
+            "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 4),
+            "max_ms": round(timings[-1] * 1000, 4),
+            "count": len(timings)}
+
+def timed(function, arguments):
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return percentiles(timings)
+
+def bench_scan(folder, database, workers):
+    results = {}
+    for cache in ("cold", "warm"):
+        library = SongLibrary(folder, SongIndex(database), workers=workers)
+        started = time.perf_counter()
+        table = library.scan()
+        results[cache] = {"seconds": round(time.perf_counter() - started, 4), "songs": len(table),
+                          "files_per_second": round(library.report.rate), "errors": len(library.report.errors)}
+        library.index.close()
+    return results, library
+
+def bench_index_load(folder, database):
+    index = SongIndex(database)
+    started = time.perf_counter()
+    rows = index.load(folder)
+    loaded = time.perf_counter() - started
+    table = SongTable(row[0:1] + row[3:8] for row in rows.values() if row[8] is None)
+    built = time.perf_counter() - started - loaded
+    index.close()
+    return {"rows": len(rows), "load_seconds": round(loaded, 4), "table_seconds": round(built, 4)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the round pipeline headless and prints the results as JSON.")
+    parser.add_argument("folder", nargs="?", help="folder with MP3 files, a synthetic library is generated when omitted")
+    parser.add_argument("--songs", type=int, default=2000, help="size of the synthetic library")
+    parser.add_argument("--seconds", type=int, default=40, help="length of each synthetic song")
+    parser.add_argument("--rounds", type=int, default=200, help="samples per timed operation")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "rounds": args.rounds}
+    with tempfile.TemporaryDirectory() as scratch:
+        folder = args.folder
+        if folder is None:
+            folder = os.path.join(scratch, "music")
+            started = time.perf_counter()
+            generate_library(folder, args.songs, seconds=args.seconds, seed=args.seed)
+            report["generate_seconds"] = round(time.perf_counter() - started, 4)
+        database = os.path.join(scratch, "library.db")
+
+        report["scan"], library = bench_scan(folder, database, args.workers)
+        report["index_load"] = bench_index_load(folder, database)
+        table = library.table
+        report["songs"] = len(table)
+        ids = table.live_ids()
+        songs = [table.song(rng.choice(ids)) for _ in range(args.rounds)]
+        songs = [song for song in songs if song.duration > 30]
+
+        if songs:
+            SongFragment.cache = None
+            report["fragment_render"] = timed(SongFragment, songs)
+            SongFragment.cache = FragmentCache()
+            starts = [(song, rng.randint(10, int(song.duration - 20))) for song in songs]
+            for song, start in starts:
+                SongFragment(song, start_time=start)
+            report["fragment_cached"] = timed(lambda item: SongFragment(item[0], start_time=item[1]), starts)
+
+        builder = RoundBuilder(library, rng=rng)
+        builder.get_sampler(table)
+        report["sampling"] = timed(lambda _: builder.get_random_choices(table, builder.sampler.pick()), range(args.rounds))
+        SongFragment.cache = None
+        report["round_build"] = timed(lambda _: builder.build_round(), range(min(args.rounds, len(songs) or 1)))
+
+        titles = [table.titles[song_id] for song_id in ids]
+        started = time.perf_counter()
+        title_index = library.get_title_index()
+        report["autocomplete_build_ms"] = round((time.perf_counter() - started) * 1000, 4)
+        queries = [title[:rng.randint(1, len(title))] for title in rng.choices(titles, k=args.rounds)]
+        report["autocomplete"] = timed(title_index.search, queries)
+        answers = library.get_answer_index()
+        report["suggestions"] = timed(answers.suggest, queries)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
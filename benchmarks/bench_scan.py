@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import ScanReport, scan_rows
+from song_index import SongIndex
+from synthetic import generate_library
+
+def run(folder, database, workers, processes):
+    index = SongIndex(database)
+    report = ScanReport()
+    rows = sum(1 for _ in scan_rows(index, folder, report, workers=workers, processes=processes))
+    index.close()
+    return rows, report
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures library scan throughput with an empty (cold) and a filled (warm) index.")
+    parser.add_argument("folder", nargs="?", help="folder with MP3 files, a synthetic library is generated when omitted")
+    parser.add_argument("--songs", type=int, default=2000, help="size of the synthetic library")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        folder = args.folder
+        if folder is None:
+            folder = os.path.join(scratch, "music")
+            started = time.perf_counter()
+            generate_library(folder, args.songs, seconds=30)
+            print(f"generated {args.songs} files in {time.perf_counter() - started:.1f} s")
+
+        modes = [("serial", 1, False), ("threads", args.workers, False), ("processes", args.workers, True)]
+        for name, workers, processes in modes:
+            database = os.path.join(scratch, f"{name}.db")
+            for cache in ("cold", "warm"):
+                rows, report = run(folder, database, workers, processes)
+                print(f"{name:10} {cache}: {report.files:6} files  {report.elapsed:7.2f} s  {report.rate:9.0f} files/s  "
+                      f"{report.parsed} parsed  {len(report.errors)} errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_server import CLIP, JSON, SessionServer, create_rounds, encode, read_message
+from synthetic import generate_library
+
+def percentiles(timings):
+    if not timings:
+        return None
+    timings = sorted(timings)
+    return {"p50_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2),
+            "count": len(timings)}
+
+class Stats:
+    def __init__(self):
+        self.delivery = []
+        self.answers = []
+        self.bytes = 0
+        self.clips = 0
+        self.correct = 0
+
+async def client(number, host, port, rounds, answer_delay, stats, rng):
+    # One fake player: picks a random choice after a random pause
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode(JSON, {"type": "hello", "name": f"bot {number}"}))
+    current = None
+    results = 0
+    try:
+        while results < rounds:
+            kind, message = await read_message(reader)
+            if kind == CLIP:
+                stats.bytes += len(message)
+                stats.clips += 1
+                await asyncio.sleep(rng.uniform(0, answer_delay))
+                writer.write(encode(JSON, {"type": "answer", "round": current["round"],
+                                           "choice": rng.randrange(len(current["choices"])),
+                                           "sent": time.perf_counter()}))
+            elif message["type"] == "round":
+                stats.delivery.append(time.time() - message["sent"])
+                current = message
+            elif message["type"] == "ack":
+                stats.answers.append(time.perf_counter() - message["sent"])
+                stats.correct += message["correct"]
+            elif message["type"] == "result":
+                results += 1
+    finally:
+        writer.close()
+
+async def run(args, folder):
+    stats = Stats()
+    library, rounds = create_rounds(folder)
+    renders = 0
+    build_round = rounds.build_round
+
+    def counted():
+        nonlocal renders
+        renders += 1
+        return build_round()
+
+    rounds.build_round = counted
+    server = SessionServer(library, rounds, args.round_time, args.pause, min_players=args.clients)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0, backlog=4096)
+    port = listener.sockets[0].getsockname()[1]
+    serving = asyncio.create_task(server.run())
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client(i, "127.0.0.1", port, args.rounds, args.answer_delay, stats,
+                                      random.Random(rng.random())) for i in range(args.clients)))
+    finally:
+        elapsed = time.perf_counter() - started
+        serving.cancel()
+        listener.close()
+        rounds.stop()
+
+    return {"clients": args.clients, "rounds": args.rounds, "seconds": round(elapsed, 2),
+            "rounds_built": renders, "rounds_played": server.number,
+            "clips_delivered": stats.clips, "megabytes_delivered": round(stats.bytes / 1e6, 2),
+            "clip_bytes": stats.bytes // max(1, stats.clips),
+            "delivery": percentiles(stats.delivery), "answer_round_trip": percentiles(stats.answers),
+            "correct": stats.correct, "top": server.scoreboard(3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a session server on loopback against many fake players and prints "
+                                                 "fan-out and answer latency as JSON.")
+    parser.add_argument("folder", nargs="?", help="folder with MP3 files, a synthetic library is generated when omitted")
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--round-time", type=float, default=2.0)
+    parser.add_argument("--pause", type=float, default=0.2)
+    parser.add_argument("--answer-delay", type=float, default=1.0, help="longest pause before a bot answers")
+    parser.add_argument("--songs", type=int, default=50, help="size of the synthetic library")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        folder = args.folder
+        if folder is None:
+            folder = os.path.join(scratch, "music")
+            generate_library(folder, args.songs, seconds=60, seed=args.seed)
+        # Run from the scratch folder so the real index and round pack in data/ are left alone
+        folder = os.path.abspath(folder)
+        os.makedirs(os.path.join(scratch, "data"))
+        os.chdir(scratch)
+        report = asyncio.run(run(args, folder))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
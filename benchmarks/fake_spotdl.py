@@ -0,0 +1,23 @@
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import FRAME
+
+# Stands in for "python -m spotdl": writes a short silent MP3 per link into the working directory
+def main():
+    links = [arg for arg in sys.argv[1:] if arg != "download"]
+    delay = float(os.environ.get("FAKE_SPOTDL_DELAY", "0.2"))
+    time.sleep(float(os.environ.get("FAKE_SPOTDL_STARTUP", "0.5")))
+    for link in links:
+        time.sleep(delay)
+        name = hashlib.sha1(link.encode()).hexdigest()[:12]
+        with open(f"{name}.mp3", "wb") as f:
+            f.write(FRAME * 40)
+        print(f'Downloaded "{name}": {link}', flush=True)
+
+if __name__ == "__main__":
+    main()
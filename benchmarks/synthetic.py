@@ -0,0 +1,34 @@
+import os
+import random
+import string
+
+from mutagen.id3 import ID3, TALB, TIT2, TPE1
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, mono, no padding; 417 bytes and 26 ms per frame
+FRAME = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+FRAME_SECONDS = 1152 / 44100
+
+def random_words(rng, count):
+    return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(count)).title()
+
+def generate_library(folder, count, seconds=60, albums_per_artist=3, songs_per_album=10, seed=1):
+    # Silent MP3s with random tags, laid out as artist/album/track like a ripped collection
+    rng = random.Random(seed)
+    audio = FRAME * int(seconds / FRAME_SECONDS)
+    paths = []
+    for i in range(count):
+        album_number = i // songs_per_album
+        artist = f"Artist {album_number // albums_per_artist:05d}"
+        album = f"Album {album_number:05d}"
+        folder_path = os.path.join(folder, artist, album)
+        os.makedirs(folder_path, exist_ok=True)
+        path = os.path.join(folder_path, f"{i % songs_per_album + 1:02d}.mp3")
+        with open(path, "wb") as f:
+            f.write(audio)
+        tags = ID3()
+        tags.add(TIT2(encoding=3, text=random_words(rng, rng.randint(1, 4))))
+        tags.add(TALB(encoding=3, text=album))
+        tags.add(TPE1(encoding=3, text=artist))
+        tags.save(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+
+class ConfigStore:
+    # Settings live in memory, changes reach the disk in one atomic write once they stop coming in for delay seconds
+    def __init__(self, path="data/config.json", delay=1.0):
+        self.path = path
+        self.delay = delay
+        self.values = {}
+        self.lock = threading.Lock()
+        self.timer = None
+        self.dirty = False
+
+    def load(self):
+        with open(self.path, "r") as f:
+            values = json.load(f)
+        with self.lock:
+            self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def set(self, key, value):
+        self.update({key: value})
+
+    def update(self, values):
+        with self.lock:
+            if all(self.values.get(key) == value for key, value in values.items()):
+                return
+            self.values = dict(self.values, **values)
+            self.dirty = True
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            self.dirty = False
+            temp = self.path + ".tmp"
+            try:
+                with open(temp, "w") as f:
+                    json.dump(self.values, f)
+                os.replace(temp, self.path)
+            except OSError as e:
+                print(f"Error saving config.json: {e}")
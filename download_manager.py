@@ -0,0 +1,127 @@
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SPOTDL_COMMAND = [sys.executable, '-m', 'spotdl']
+
+class DownloadJob:
+    def __init__(self, links, folder):
+        self.links = links
+        self.folder = folder
+        self.status = 'queued'
+        self.done = 0
+        self.files = []
+        self.error = None
+        self.started = None
+        self.finished = None
+
+class DownloadManager:
+    def __init__(self, workers=2, batch_size=10, command=None, on_files=None, staging_dir='data/downloads'):
+        self.workers = max(1, workers)
+        self.staging_dir = staging_dir
+        os.makedirs(staging_dir, exist_ok=True)
+        self.batch_size = max(1, batch_size)
+        self.command = command or SPOTDL_COMMAND
+        self.on_files = on_files
+        self.jobs = []
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.ffmpeg_checked = False
+        # Held while ffmpeg is fetched so other workers wait for it, without blocking progress() and add() on self.lock
+        self.ffmpeg_lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def add(self, links, folder):
+        # Links are split into batches so one spotdl process handles many songs
+        jobs = []
+        os.makedirs(folder, exist_ok=True)
+        for i in range(0, len(links), self.batch_size):
+            job = DownloadJob(links[i:i + self.batch_size], folder)
+            jobs.append(job)
+            with self.lock:
+                self.jobs.append(job)
+            self.queue.put(job)
+        return jobs
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            try:
+                self.download(job)
+            finally:
+                with self.lock:
+                    self.active -= 1
+
+    def ensure_ffmpeg(self):
+        # spotdl needs ffmpeg, it is fetched on the first download instead of on every start of the game
+        with self.ffmpeg_lock:
+            if self.ffmpeg_checked:
+                return
+            self.ffmpeg_checked = True
+            if self.command != SPOTDL_COMMAND or shutil.which('ffmpeg'):
+                return
+            spotdl_dir = os.path.expanduser('~/.spotdl')
+            if os.path.isdir(spotdl_dir) and any(name.startswith('ffmpeg') for name in os.listdir(spotdl_dir)):
+                return
+            subprocess.run(self.command + ['--download-ffmpeg'], stdin=subprocess.DEVNULL)
+
+    def download(self, job):
+        job.status = 'downloading'
+        job.started = time.monotonic()
+        self.ensure_ffmpeg()
+        # Each job downloads into its own staging folder, the game's working directory is left alone
+        staging = tempfile.mkdtemp(prefix='download-', dir=self.staging_dir)
+        try:
+            process = subprocess.Popen(self.command + ['download'] + job.links, cwd=staging,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                       text=True, errors='replace')
+            for line in process.stdout:
+                if line.startswith(('Downloaded', 'Skipping')):
+                    job.done = min(job.done + 1, len(job.links))
+            process.wait()
+            if process.returncode != 0:
+                job.error = f'spotdl exited with code {process.returncode}'
+        except OSError as e:
+            job.error = str(e)
+        for name in sorted(os.listdir(staging)):
+            if name.endswith('.mp3'):
+                target = os.path.join(job.folder, name)
+                shutil.move(os.path.join(staging, name), target)
+                job.files.append(target)
+        shutil.rmtree(staging, ignore_errors=True)
+        job.done = len(job.links)
+        job.finished = time.monotonic()
+        job.status = 'failed' if job.error else 'finished'
+        if job.files and self.on_files:
+            self.on_files(job.files)
+
+    def progress(self):
+        with self.lock:
+            jobs = list(self.jobs)
+        total = sum(len(job.links) for job in jobs)
+        done = sum(job.done for job in jobs)
+        failed = sum(1 for job in jobs if job.status == 'failed')
+        started = [job.started for job in jobs if job.started is not None]
+        eta = None
+        if done and started and done < total:
+            elapsed = time.monotonic() - min(started)
+            eta = elapsed / done * (total - done)
+        return done, total, failed, eta
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put(None)
@@ -1,37 +1,44 @@
 import customtkinter as ctk
 import os
-import threading
 
-def download_song(song_link):
-    os.system(f'python -m spotdl {song_link}')
-
-def download(download_folder, links_field):
-    if not os.path.exists(f'music/{download_folder.get()}'):
-        os.mkdir(f'music/{download_folder.get()}')
-    os.chdir(f'music/{download_folder.get()}')
-    threads = []
-    for line in links_field.get('1.0', ctk.END).split():
-        thread = threading.Thread(target=download_song, args=(line,))
-        thread.start()
-        threads.append(thread)
-
-        for thread in threads:
-            thread.join()
-
-def main():
+from download_manager import DownloadManager
+
+def progress_text(manager):
+    done, total, failed, eta = manager.progress()
+    if not total:
+        return ''
+    text = f'Downloaded {done}/{total} songs'
+    if failed:
+        text += f', {failed} batches failed'
+    if eta is not None:
+        text += f', about {round(eta)} s left'
+    return text
+
+def download(manager, download_folder, links_field):
+    links = links_field.get('1.0', ctk.END).split()
+    if links:
+        manager.add(links, os.path.join('music', download_folder.get()))
+
+def poll_progress(downloader_root, manager, progress_label):
+    progress_label.configure(text=progress_text(manager))
+    downloader_root.after(500, poll_progress, downloader_root, manager, progress_label)
+
+def main(on_files=None, workers=2, batch_size=10):
     downloader_root = ctk.CTk()
-    
+
     downloader_root.title('Spotify Downloader')
-    downloader_root.geometry('500x400')
+    downloader_root.geometry('500x440')
 
     downloader_root.iconbitmap('data/downloader.ico')
-    
+
+    manager = DownloadManager(workers=workers, batch_size=batch_size, on_files=on_files)
+
     downloader_info = ctk.CTkLabel(downloader_root, text='Spotify Downloader. Please be patient during the download process.', font=('Arial', 12))
     downloader_info.pack(pady=10)
 
     info_label = ctk.CTkLabel(downloader_root, text='Enter the download folder name:')
     info_label.pack(pady=10)
-    
+
     download_folder = ctk.CTkEntry(downloader_root, width=200)
     download_folder.pack(pady=10)
 
@@ -41,7 +48,12 @@ def main():
     links_field = ctk.CTkTextbox(downloader_root, height=120, width=300)
     links_field.pack(pady=10)
 
-    download_button = ctk.CTkButton(downloader_root, text='Download', command=lambda: download(download_folder, links_field))
+    download_button = ctk.CTkButton(downloader_root, text='Download', command=lambda: download(manager, download_folder, links_field))
     download_button.pack(pady=10)
 
+    progress_label = ctk.CTkLabel(downloader_root, text='')
+    progress_label.pack(pady=5)
+    poll_progress(downloader_root, manager, progress_label)
+
     downloader_root.mainloop()
+    manager.stop()
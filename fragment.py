@@ -0,0 +1,83 @@
+import random
+import subprocess
+
+import tracing
+from mp3frames import apply_gain, cut_file
+
+class SongFragment:
+    cache = None
+    pack = None
+    normalizer = None
+
+    def __init__(self, song, length=10, start_time=None):
+        self.song = song
+        self.length = length
+        self.start_time = start_time
+        self.fragment_data = self.create_fragment()
+
+    @tracing.traced("fragment.create")
+    def create_fragment(self):
+        fragment = self.load_fragment()
+        if fragment and self.normalizer is not None:
+            # Gain goes straight into the frames' global_gain fields, the clip is never decoded for it
+            steps = self.normalizer.gain_steps(self.song.filepath)
+            if steps:
+                with tracing.span("fragment.gain"):
+                    fragment = apply_gain(fragment, steps)
+        return fragment
+
+    def load_fragment(self):
+        if self.pack is not None and self.start_time is None:
+            # Pre-rendered clips are served as slices of the mapped round pack
+            picked = self.pack.pick(self.song.filepath)
+            if picked is not None:
+                tracing.count("fragment.pack_hit")
+                self.start_time, fragment = picked
+                return fragment
+        if self.start_time is None and self.normalizer is not None:
+            self.start_time = self.normalizer.start(self.song.filepath)
+        try:
+            if self.start_time is None:
+                self.start_time = random.randint(10, int(self.song.duration - 20))
+        except Exception as e:
+            print(f"Error processing {self.song.filepath}, skipping... Error: {str(e)}")
+            return None
+        if self.cache is None:
+            return self.render(self.start_time)
+        try:
+            key = self.cache.key(self.song.filepath, self.start_time, self.length)
+        except OSError as e:
+            print(f"Error processing {self.song.filepath}, skipping... Error: {str(e)}")
+            return None
+        with tracing.span("fragment.cache_get"):
+            fragment = self.cache.get(key)
+        if fragment is None:
+            tracing.count("fragment.cache_miss")
+            fragment = self.render(self.start_time)
+            if fragment:
+                with tracing.span("fragment.cache_put"):
+                    self.cache.put(key, fragment)
+        return fragment
+
+    def render(self, start_time):
+        try:
+            with tracing.span("fragment.cut"):
+                fragment = cut_file(self.song.filepath, start_time, self.length)
+            if fragment:
+                return fragment
+        except Exception as e:
+            print(f"Could not cut {self.song.filepath} on frame boundaries, using ffmpeg. Error: {str(e)}")
+        return self.create_fragment_ffmpeg(start_time)
+
+    @tracing.traced("fragment.ffmpeg")
+    def create_fragment_ffmpeg(self, start_time):
+        try:
+            cmd = ["ffmpeg", "-ss", str(start_time), "-i", self.song.filepath, "-t", str(self.length),
+                   "-vn", "-c:a", "libmp3lame", "-f", "mp3", "pipe:1"]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+            if result.returncode != 0 or not result.stdout:
+                raise ValueError(f"ffmpeg exited with code {result.returncode}")
+            return result.stdout
+        except Exception as e:
+            print(f"Error processing {self.song.filepath}, skipping... Error: {str(e)}")
+            return None
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+def path_hash(path):
+    return hashlib.sha1(os.path.normpath(path).encode("utf-8", "surrogateescape")).hexdigest()[:16]
+
+class FragmentCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.disk_entries = OrderedDict()
+        self.disk_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.load_disk_entries()
+
+    def key(self, path, start, length, format="mp3"):
+        path = os.path.normpath(path)
+        return (path, os.stat(path).st_mtime_ns, start, length, format)
+
+    def disk_name(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8", "surrogateescape")).hexdigest()[:16]
+        return f"{path_hash(key[0])}-{digest}.{key[4]}"
+
+    def load_disk_entries(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.disk_entries[name] = size
+            self.disk_size += size
+        self.trim_disk()
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+            name = self.disk_name(key) if self.disk_dir else None
+            if name not in self.disk_entries:
+                self.misses += 1
+                return None
+            self.disk_entries.move_to_end(name)
+        try:
+            with open(os.path.join(self.disk_dir, name), "rb") as f:
+                data = f.read()
+            os.utime(os.path.join(self.disk_dir, name))
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.disk_hits += 1
+            self.store(key, data)
+        return data
+
+    def put(self, key, data):
+        with self.lock:
+            self.store(key, data)
+        if self.disk_dir and len(data) <= self.max_disk_bytes:
+            name = self.disk_name(key)
+            path = os.path.join(self.disk_dir, name)
+            try:
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"Error writing fragment cache file {path}: {e}")
+                return
+            with self.lock:
+                self.disk_size += len(data) - self.disk_entries.pop(name, 0)
+                self.disk_entries[name] = len(data)
+                self.trim_disk()
+
+    def store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def trim_disk(self):
+        while self.disk_size > self.max_disk_bytes and self.disk_entries:
+            name, size = self.disk_entries.popitem(last=False)
+            self.disk_size -= size
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except OSError:
+                pass
+
+    def invalidate(self, path):
+        path = os.path.normpath(path)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == path]:
+                self.size -= len(self.entries.pop(key))
+            prefix = path_hash(path) + "-"
+            for name in [name for name in self.disk_entries if name.startswith(prefix)]:
+                self.disk_size -= self.disk_entries.pop(name)
+                try:
+                    os.remove(os.path.join(self.disk_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "disk_entries": len(self.disk_entries),
+                "disk_bytes": self.disk_size,
+            }
@@ -0,0 +1,129 @@
+import bisect
+import re
+import unicodedata
+
+FEATURING = re.compile(r"\s*[\(\[]\s*(feat|ft|featuring|with)\b.*?[\)\]]|\s+(feat|ft|featuring)\b.*$", re.IGNORECASE)
+NON_WORD = re.compile(r"[\W_]+")
+MAX_TOLERANCE = 2
+
+def normalize_title(title):
+    title = str(title).split(" - ")[0]
+    title = FEATURING.sub("", title)
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    title = title.casefold().replace("&", " and ")
+    return NON_WORD.sub(" ", title).strip()
+
+def edit_distance(a, b, limit):
+    # Edit distance counting swapped neighbouring letters as one typo, restricted to a band around the
+    # diagonal; anything above limit is reported as limit + 1
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    before = None
+    for i in range(1, len(a) + 1):
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= limit else too_far
+        ca = a[i - 1]
+        best = current[0]
+        for j in range(low, high + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value if value < too_far else too_far
+            if value < best:
+                best = value
+        if best > limit:
+            return too_far
+        before = previous
+        previous = current
+    return previous[-1]
+
+def common_prefix(a, b):
+    length = min(len(a), len(b))
+    i = 0
+    while i < length and a[i] == b[i]:
+        i += 1
+    return i
+
+def longest_prefix(keys, text):
+    # In a sorted list the longest shared prefix is always with one of the two keys around the insertion point
+    i = bisect.bisect_left(keys, text)
+    return max([common_prefix(text, keys[j]) for j in (i - 1, i) if 0 <= j < len(keys)] or [0])
+
+class AnswerIndex:
+    def __init__(self, titles):
+        self.titles = {}
+        for title in titles:
+            self.titles.setdefault(normalize_title(title), []).append(str(title))
+        self.keys = sorted(self.titles)
+        self.reversed_keys = sorted(key[::-1] for key in self.keys)
+        self.alphabet = "".join(sorted({c for key in self.keys for c in key}))
+
+    def neighbors(self, text, first, last):
+        # Strings one edit away from text, with the edit at a position between first and last
+        for i in range(max(0, first), min(len(text), last) + 1):
+            left = text[:i]
+            right = text[i:]
+            if right:
+                yield left + right[1:]
+                if len(right) > 1:
+                    yield left + right[1] + right[0] + right[2:]
+                for c in self.alphabet:
+                    yield left + c + right[1:]
+            for c in self.alphabet:
+                yield left + c + right
+
+    def close_keys(self, key):
+        if key in self.titles:
+            return {key}
+        # An edit can only sit where the unchanged part before it is a prefix of some key and the part after it a suffix
+        prefix = longest_prefix(self.keys, key)
+        suffix = longest_prefix(self.reversed_keys, key[::-1])
+        return {neighbor for neighbor in self.neighbors(key, len(key) - suffix - 2, prefix) if neighbor in self.titles}
+
+    def tolerance_for(self, key, tolerance):
+        # Short titles need an exact match, otherwise one typo every four characters
+        return min(tolerance, MAX_TOLERANCE, len(key) // 4)
+
+    def is_correct(self, answer, correct_key, tolerance=MAX_TOLERANCE):
+        answer = normalize_title(answer)
+        limit = self.tolerance_for(correct_key, tolerance)
+        distance = edit_distance(answer, correct_key, limit)
+        if distance == 0:
+            return True
+        if distance > limit:
+            return False
+        # A typo is only forgiven if no other song is at least as close (or, two edits away, closer) to what was typed
+        return not self.close_keys(answer) - {correct_key}
+
+    def prefixed(self, prefix, limit):
+        keys = []
+        for i in range(bisect.bisect_left(self.keys, prefix), len(self.keys)):
+            if len(keys) == limit or not self.keys[i].startswith(prefix):
+                break
+            keys.append(self.keys[i])
+        return keys
+
+    def suggest(self, text, limit=10):
+        text = normalize_title(text)
+        if not text:
+            return []
+        keys = self.prefixed(text, limit)
+        if len(keys) < limit and len(text) >= 3:
+            # Typing goes left to right, so the typo is right where the text stopped matching any title
+            matched = longest_prefix(self.keys, text)
+            seen = set(keys)
+            for neighbor in self.neighbors(text, matched - 1, matched):
+                for key in self.prefixed(neighbor, limit - len(keys)):
+                    if key not in seen:
+                        keys.append(key)
+                        seen.add(key)
+                if len(keys) >= limit:
+                    break
+        return [title for key in keys for title in self.titles[key]][:limit]
@@ -0,0 +1,274 @@
+import os
+import sys
+import threading
+from array import array
+
+import tracing
+from fuzzy import AnswerIndex, normalize_title
+from search_index import TitleIndex
+from scanner import ScanReport, scan_rows
+from song_index import SongIndex, is_inside, read_metadata
+
+def intern(text):
+    return sys.intern(text) if text is not None else None
+
+class Song:
+    __slots__ = ("filepath", "title", "album", "duration", "bitrate", "artist", "id")
+
+    def __init__(self, filepath, title=None, album=None, duration=None, bitrate=None, artist=None, song_id=None):
+        self.filepath = filepath
+        if title is None:
+            try:
+                title, album, duration, bitrate, artist = read_metadata(filepath)
+            except Exception as e:
+                raise ValueError(f"Error reading MP3 metadata from {filepath}: {e}")
+        self.title = title
+        self.album = album
+        self.artist = artist
+        self.duration = duration
+        self.bitrate = bitrate
+        self.id = song_id
+
+    @property
+    def key(self):
+        return normalize_title(self.title)
+
+class SongTable:
+    # Column per field, a song is just its position; removed positions are reused by the next added song
+    def __init__(self, rows=()):
+        self.paths = []
+        self.titles = []
+        self.albums = []
+        self.artists = []
+        self.durations = array("d")
+        self.bitrates = array("l")
+        self.ids = {}
+        self.free = []
+        for row in rows:
+            self.put(*row)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def put(self, filepath, title, album, duration, bitrate, artist):
+        song_id = self.ids.get(filepath)
+        if song_id is None:
+            if self.free:
+                song_id = self.free.pop()
+            else:
+                song_id = len(self.paths)
+                self.paths.append(None)
+                self.titles.append(None)
+                self.albums.append(None)
+                self.artists.append(None)
+                self.durations.append(0)
+                self.bitrates.append(0)
+            self.ids[filepath] = song_id
+        self.paths[song_id] = filepath
+        self.titles[song_id] = intern(title)
+        self.albums[song_id] = intern(album)
+        self.artists[song_id] = intern(artist)
+        self.durations[song_id] = duration or 0
+        self.bitrates[song_id] = bitrate or 0
+        return song_id
+
+    def remove(self, filepath):
+        song_id = self.ids.pop(filepath)
+        self.paths[song_id] = None
+        self.titles[song_id] = None
+        self.albums[song_id] = None
+        self.artists[song_id] = None
+        self.free.append(song_id)
+
+    def live_ids(self):
+        return sorted(self.ids.values())
+
+    def song(self, song_id):
+        return Song(self.paths[song_id], self.titles[song_id], self.albums[song_id],
+                    self.durations[song_id], self.bitrates[song_id], self.artists[song_id], song_id)
+
+    def label(self, song_id):
+        title = self.titles[song_id]
+        album = self.albums[song_id]
+        return f"{title}   ({album})" if album is not None else title
+
+class SongLibrary:
+    def __init__(self, songs_dir, index=None, on_error=None, workers=None, processes=False, min_ready=20):
+        self.songs_dir = songs_dir
+        self.index = index or SongIndex()
+        self.on_error = on_error
+        self.workers = workers
+        self.processes = processes
+        self.min_ready = min_ready
+        self.lock = threading.RLock()
+        self.ready = threading.Condition(self.lock)
+        self.scanning = 0
+        self.generation = 0
+        self.report = None
+        self.table = None
+        self.title_index = None
+        self.answer_index = None
+        self.index_version = 0
+        self.version = 0
+        self.listeners = []
+
+    def is_loaded(self):
+        return self.table is not None
+
+    def get_table(self):
+        # Waits for a running scan to publish, but never scans on the caller's thread; None when nothing is scanning
+        with self.lock:
+            while self.table is None and self.scanning:
+                self.ready.wait()
+            return self.table
+
+    def get_titles(self):
+        with self.lock:
+            table = self.get_table()
+            if table is None:
+                return []
+            return [table.titles[song_id] for song_id in table.live_ids()]
+
+    def get_title_index(self):
+        with self.lock:
+            if self.title_index is None:
+                self.title_index = TitleIndex(self.get_titles())
+            return self.title_index
+
+    def get_answer_index(self):
+        with self.lock:
+            if self.answer_index is None:
+                self.answer_index = AnswerIndex(self.get_titles())
+            return self.answer_index
+
+    def refresh_indexes(self):
+        # Builds the search indexes on the calling thread, the UI keeps using the old ones until they are swapped in
+        with self.lock:
+            if self.table is None:
+                return
+            version = self.version
+            generation = self.generation
+            titles = self.get_titles()
+        title_index = TitleIndex(titles)
+        answer_index = AnswerIndex(titles)
+        with self.lock:
+            if generation == self.generation and version >= self.index_version:
+                self.title_index = title_index
+                self.answer_index = answer_index
+                self.index_version = version
+
+    def publish(self, table):
+        if table is not self.table:
+            # A streamed scan publishes its table early, the final publish keeps the indexes until they are rebuilt
+            self.title_index = None
+            self.answer_index = None
+        self.table = table
+        self.version += 1
+        for listener in self.listeners:
+            listener(None, None)
+        self.ready.notify_all()
+
+    @tracing.traced("library.scan")
+    def scan(self, on_progress=None):
+        # Rounds can start as soon as min_ready songs are in, the rest keeps streaming into the same table
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            songs_dir = self.songs_dir
+            self.scanning += 1
+        report = ScanReport()
+        table = SongTable()
+        published = False
+        try:
+            for row in scan_rows(self.index, songs_dir, report, on_progress, self.workers, self.processes):
+                with self.lock:
+                    if generation != self.generation:
+                        return None
+                    table.put(*row)
+                    if not published and len(table) >= self.min_ready:
+                        published = True
+                        self.publish(table)
+                    elif published and len(table) % 1000 == 0:
+                        self.version += 1
+            with self.lock:
+                if generation != self.generation:
+                    return None
+                self.report = report
+                self.publish(table)
+        finally:
+            with self.lock:
+                self.scanning -= 1
+                self.ready.notify_all()
+        self.refresh_indexes()
+        return table
+
+    def scan_async(self, on_progress=None, on_done=None):
+        # Counted as scanning before the thread starts, so get_table waits for this scan instead of finding nothing
+        with self.lock:
+            self.scanning += 1
+
+        def run():
+            try:
+                table = self.scan(on_progress)
+            finally:
+                with self.lock:
+                    self.scanning -= 1
+                    self.ready.notify_all()
+            if on_done:
+                on_done(table, self.report)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def change_folder(self, new_folder):
+        with self.lock:
+            self.songs_dir = new_folder
+            self.generation += 1
+            self.table = None
+            self.title_index = None
+            self.answer_index = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    @tracing.traced("library.apply_changes")
+    def apply_changes(self, paths):
+        # Applies watcher events as deltas instead of walking the whole folder again. Folders are walked and tags
+        # parsed without the lock, the UI thread takes it for the title and answer indexes.
+        songs_dir = os.path.normpath(self.songs_dir)
+        targets = set()
+        missing = []
+        for path in paths:
+            path = os.path.normpath(path)
+            if not is_inside(path, songs_dir):
+                continue
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    targets.update(os.path.join(root, file) for file in files if file.endswith(".mp3"))
+            elif os.path.exists(path):
+                if path.endswith(".mp3"):
+                    targets.add(path)
+            else:
+                targets.add(path)
+                missing.append(path)
+        with self.lock:
+            if self.table is None:
+                return
+            for path in missing:
+                targets.update(known for known in self.table.ids if is_inside(known, path))
+        if not targets:
+            return
+        updated, removed = self.index.update(targets, self.on_error)
+        with self.lock:
+            if self.table is None:
+                return
+            changed = [self.table.song(self.table.put(*row)) for row in updated]
+            gone = [path for path in removed if path in self.table.ids]
+            for path in gone:
+                self.table.remove(path)
+            if not changed and not gone:
+                return
+            self.version += 1
+            for listener in self.listeners:
+                listener(changed, gone)
+        self.refresh_indexes()
@@ -0,0 +1,244 @@
+import functools
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+SAMPLE_RATE = 22050
+BLOCK = 0.4
+HOP = 0.1
+STEP_DB = 1.5
+MAX_STEPS = 12
+BATCH_SIZE = 8
+CHUNK = 1 << 18
+FILTER_LENGTH = 4096
+
+def available():
+    # NumPy is optional, without it songs simply play at their own level
+    try:
+        import numpy
+    except ImportError:
+        return False
+    return True
+
+def decode(path, rate=SAMPLE_RATE, chunk=CHUNK):
+    # Streams the song as 16-bit mono PCM a chunk at a time, so an hour-long mix never sits in memory whole
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(["ffmpeg", "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(rate), "-f", "s16le", "pipe:1"],
+                                   stdout=subprocess.PIPE, stderr=errors, stdin=subprocess.DEVNULL)
+        received = 0
+        try:
+            while True:
+                data = process.stdout.read(chunk * 2)
+                if not data:
+                    break
+                received += len(data)
+                yield data
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if process.returncode != 0 or not received:
+            errors.seek(0)
+            raise ValueError(errors.read().decode(errors="replace").strip() or f"ffmpeg exited with code {process.returncode}")
+
+def biquad(b, a, samples):
+    y1 = y2 = x1 = x2 = 0.0
+    out = []
+    for x in samples:
+        y = (b[0] * x + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2) / a[0]
+        out.append(y)
+        x1, x2, y1, y2 = x, x1, y, y1
+    return out
+
+@functools.lru_cache(maxsize=2)
+def impulse_response(rate):
+    # The two BS.1770 K-weighting biquads (high shelf, then high pass) as a FIR filter; the 38 Hz high pass decays
+    # within a few hundred samples, so FILTER_LENGTH taps lose nothing measurable
+    w0 = 2 * math.pi * 1681.97 / rate
+    gain = 10 ** (3.9998 / 40)
+    alpha = math.sin(w0) / (2 * 0.7072)
+    cos = math.cos(w0)
+    root = 2 * math.sqrt(gain) * alpha
+    impulse = [1.0] + [0.0] * (FILTER_LENGTH - 1)
+    shelf = biquad((gain * ((gain + 1) + (gain - 1) * cos + root), -2 * gain * ((gain - 1) + (gain + 1) * cos),
+                    gain * ((gain + 1) + (gain - 1) * cos - root)),
+                   ((gain + 1) - (gain - 1) * cos + root, 2 * ((gain - 1) - (gain + 1) * cos), (gain + 1) - (gain - 1) * cos - root),
+                   impulse)
+    w0 = 2 * math.pi * 38.14 / rate
+    alpha = math.sin(w0) / (2 * 0.5003)
+    cos = math.cos(w0)
+    return biquad(((1 + cos) / 2, -(1 + cos), (1 + cos) / 2), (1 + alpha, -2 * cos, 1 - alpha), shelf)
+
+@functools.lru_cache(maxsize=4)
+def k_weighting(size, rate):
+    # The filter's spectrum on the bins of a size-point FFT, for overlap-add filtering chunk by chunk
+    import numpy as np
+    return np.fft.rfft(np.array(impulse_response(rate)), size)
+
+def measure(chunks, rate=SAMPLE_RATE, length=10):
+    # Gated integrated loudness (BS.1770 on a mono downmix), sample peak, and the loudest length-second window.
+    # chunks is the PCM in pieces of at most CHUNK samples; only the energy of every 100 ms hop is kept.
+    import numpy as np
+    hop = int(rate * HOP)
+    block = int(rate * BLOCK)
+    size = 1 << (CHUNK + FILTER_LENGTH - 2).bit_length()
+    response = k_weighting(size, rate)
+    tail = np.zeros(FILTER_LENGTH - 1)
+    pending = np.zeros(0)
+    leftover = b""
+    hops = []
+    peak = 0.0
+    count = 0
+    for data in chunks:
+        data = leftover + data
+        leftover = data[len(data) & ~1:]
+        samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2).astype(np.float32) / 32768
+        if not len(samples):
+            continue
+        count += len(samples)
+        peak = max(peak, float(np.max(np.abs(samples))))
+        # Overlap-add: the filter's ringing past the end of this chunk is added to the start of the next one
+        weighted = np.fft.irfft(np.fft.rfft(samples, size) * response, size)[:len(samples) + FILTER_LENGTH - 1]
+        weighted[:FILTER_LENGTH - 1] += tail
+        tail = weighted[len(samples):].copy()
+        weighted = np.concatenate((pending, weighted[:len(samples)]))
+        usable = len(weighted) // hop * hop
+        hops.append((weighted[:usable] ** 2).reshape(-1, hop).sum(axis=1))
+        pending = weighted[usable:]
+    if count < block:
+        raise ValueError("too short to measure")
+    energy = np.concatenate(([0.0], np.cumsum(np.concatenate(hops))))
+
+    # 400 ms blocks every 100 ms, each the sum of four hops
+    span = block // hop
+    powers = (energy[span:] - energy[:-span]) / block
+    levels = -0.691 + 10 * np.log10(np.maximum(powers, 1e-12))
+    gated = powers[levels > -70]
+    if not len(gated):
+        loudness = -70.0
+    else:
+        relative = -0.691 + 10 * np.log10(gated.mean()) - 10
+        gated = powers[(levels > -70) & (levels > relative)]
+        loudness = float(-0.691 + 10 * np.log10(gated.mean())) if len(gated) else -70.0
+
+    per_second = rate // hop
+    seconds = np.arange(10, max(10, int(count / rate) - length - 10) + 1)
+    seconds = seconds[(seconds + length) * per_second < len(energy)]
+    start = None
+    if len(seconds):
+        windows = energy[(seconds + length) * per_second] - energy[seconds * per_second]
+        start = float(seconds[int(np.argmax(windows))])
+    return loudness, peak, start
+
+def analyze_batch(batch, length=10):
+    rows = []
+    for path, mtime, size in batch:
+        try:
+            loudness, peak, start = measure(decode(path), length=length)
+            rows.append((path, mtime, size, loudness, peak, start, None))
+        except OSError:
+            # ffmpeg could not be started, nothing is known about the song so it stays pending
+            continue
+        except Exception as e:
+            rows.append((path, mtime, size, None, None, None, str(e)))
+    return rows
+
+class Normalizer:
+    # Turns the stored measurements into a gain for each clip, in the 1.5 dB steps an MP3 frame can take losslessly
+    def __init__(self, target=-16.0, energetic_starts=False):
+        self.target = target
+        self.energetic_starts = energetic_starts
+        self.levels = {}
+
+    def load(self, index, songs_dir):
+        self.levels = index.load_loudness(songs_dir)
+
+    def update(self, rows):
+        for path, _, _, loudness, peak, start, error in rows:
+            if error is None:
+                self.levels[path] = (loudness, peak, start)
+
+    def gain_steps(self, path):
+        level = self.levels.get(path)
+        if level is None:
+            return 0
+        loudness, peak, _ = level
+        steps = round((self.target - loudness) / STEP_DB)
+        if peak > 0:
+            # Never push the loudest sample past full scale
+            steps = min(steps, math.floor(-20 * math.log10(peak) / STEP_DB))
+        return max(-MAX_STEPS, min(MAX_STEPS, steps))
+
+    def start(self, path):
+        level = self.levels.get(path)
+        if not self.energetic_starts or level is None:
+            return None
+        return int(level[2]) if level[2] is not None else None
+
+class LoudnessAnalyzer:
+    # Measures every song once on a background process pool; results are saved per batch so a restart resumes
+    def __init__(self, index, normalizer, workers=None, length=10):
+        self.index = index
+        self.normalizer = normalizer
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.length = length
+        self.running = False
+        self.thread = None
+        self.done = 0
+        self.total = 0
+
+    def start(self, songs_dir, on_progress=None):
+        self.stop()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, args=(songs_dir, on_progress), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self, songs_dir, on_progress=None):
+        if shutil.which("ffmpeg") is None:
+            # Without a decoder every song would fail; leave them pending until ffmpeg is installed
+            print("ffmpeg not found, loudness is not measured")
+            return
+        pending = [row[:3] for row in self.index.pending_loudness(songs_dir)]
+        self.done = 0
+        self.total = len(pending)
+        if not pending:
+            return
+        batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        # A multiprocessing pool rather than an executor: stopping has to kill the workers mid-batch, closing the game
+        # would otherwise wait for every batch already handed to them
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            results = []
+            while (batches or results) and self.running:
+                while batches and len(results) < self.workers * 2:
+                    results.append(pool.apply_async(analyze_batch, (batches.pop(), self.length)))
+                results[0].wait(0.5)
+                done = [result for result in results if result.ready()]
+                results = [result for result in results if result not in done]
+                for result in done:
+                    rows = result.get()
+                    self.index.save_loudness(rows)
+                    self.normalizer.update(rows)
+                    self.done += len(rows)
+                if on_progress:
+                    on_progress(self.done, self.total)
+        finally:
+            # When stopped, batches still in the pool are dropped; they are simply measured again next time
+            if self.running:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
@@ -1,27 +1,40 @@
+import time
+STARTED = time.perf_counter()
+import sys
 import threading
-import customtkinter as ctk
-import random
-from pydub import AudioSegment
-import pygame
-from mutagen.mp3 import MP3
-import tempfile
 import os
-import subprocess
-import json
-from tkinter import messagebox, filedialog
-from PIL import Image
-import time
 
-from downloader import main
-if not os.path.exists("data/config.json"):
-    import setup as setup
-    
+import tracing
+# --profile-startup has to be known before the heavy imports so they can be timed too
+if "--profile-startup" in sys.argv:
+    tracing.enable()
+
+with tracing.span("import.customtkinter"):
+    import customtkinter as ctk
+    from tkinter import messagebox, filedialog
+with tracing.span("import.pil"):
+    from PIL import Image
+with tracing.span("import.game"):
+    from audio_engine import AudioEngine
+    from config_store import ConfigStore
+    from library import SongLibrary
+    from search_index import TitleIndex
+    from fragment import SongFragment
+    from fragment_cache import FragmentCache
+    from round_pack import RoundPack
+    import loudness
+    from rounds import RoundBuilder, RoundQueue
+    from watcher import create_watcher
+
 class AutocompleteCTkEntry(ctk.CTkEntry):
-    def __init__(self, *args, completion_list=None, **kwargs):
+    def __init__(self, *args, completion_list=None, max_hits=10, **kwargs):
         super().__init__(*args, **kwargs)
-        self._completion_list = completion_list or []
+        self._index = TitleIndex(completion_list or [])
+        self._fuzzy_index = None
+        self._max_hits = max_hits
         self._hits = []
         self._hit_index = 0
+        self._typed = ""
         self.position = 0
         self.bind('<KeyRelease>', self.handle_keyrelease)
         
@@ -32,23 +45,32 @@ class AutocompleteCTkEntry(ctk.CTkEntry):
         self.bind('<Shift-Tab>', self.previous_option)
         self.bind('<Up>', self.previous_option)
 
-    def set_completion_list(self, completion_list):
-        self._completion_list = completion_list
+    def set_search_index(self, index, fuzzy_index=None):
+        self._index = index
+        self._fuzzy_index = fuzzy_index
 
     def autocomplete(self):
-        self.position = len(self.get())
-        _hits = []
-        for element in self._completion_list:
-            if str(element).lower().startswith(self.get().lower()):
-                _hits.append(element)
+        typed = self.get()
+        self._typed = typed.lower()
+        self.position = len(typed)
+        _hits = self._index.search(typed, self._max_hits)
+        if not _hits and self._fuzzy_index is not None:
+            # Nothing contains the typed text, so offer titles one typo away
+            _hits = self._fuzzy_index.suggest(typed, self._max_hits)
 
         if _hits != self._hits:
             self._hit_index = 0
             self._hits = _hits
 
-        if self._hits:
-            self.delete(0, ctk.END)
-            self.insert(0, self._hits[self._hit_index])
+        if self._hits and self._hits[0].lower().startswith(self._typed):
+            self.show_hit()
+
+    def show_hit(self):
+        hit = self._hits[self._hit_index]
+        self.delete(0, ctk.END)
+        self.insert(0, hit)
+        # Only the completed part of a prefix hit is selected, so typing on replaces just that part
+        if hit.lower().startswith(self._typed):
             self.select_range(self.position, ctk.END)
 
     def handle_keyrelease(self, event):
@@ -56,90 +78,53 @@ class AutocompleteCTkEntry(ctk.CTkEntry):
             self.autocomplete()
     
     def next_option(self, event):
-        self._hit_index = (self._hit_index + 1) % len(self._hits)
-        self.delete(0, ctk.END)
-        self.insert(0, self._hits[self._hit_index])
-        self.select_range(self.position, ctk.END)
+        if self._hits:
+            self._hit_index = (self._hit_index + 1) % len(self._hits)
+            self.show_hit()
     
     def previous_option(self, event):
-        self._hit_index = (self._hit_index - 1) % len(self._hits)
-        self.delete(0, ctk.END)
-        self.insert(0, self._hits[self._hit_index])
-        self.select_range(self.position, ctk.END)
-
-class Song:
-    def __init__(self, filepath):
-        self.filepath = filepath
-        try:
-            audio = MP3(filepath)
-            self.title = audio.get('TIT2', None)
-            self.album = audio.get('TALB', None)
-            if self.title is None:
-                self.title = os.path.basename(filepath).replace(".mp3", "")
-        except Exception as e:
-            raise ValueError(f"Error reading MP3 metadata from {filepath}: {e}")
-
-class SongFragment:
-    def __init__(self, song):
-        self.song = song
-        self.fragment_data = self.create_fragment()
-
-    def create_fragment(self):
-        try:
-            song_duration = AudioSegment.from_file(self.song.filepath).duration_seconds
-            start_time = random.randint(10, int(song_duration - 20))
-            end_time = start_time + 10
-            cmd = f'ffmpeg -i "{self.song.filepath}" -ss {start_time} -to {end_time} -c:a libmp3lame data/temp.mp3'
-            subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-            with open("data/temp.mp3", "rb") as f:
-                return f.read()
-        except Exception as e:
-            print(f"Error processing {self.song.filepath}, skipping... Error: {str(e)}")
-            return None
-
-class SongLibrary:
-    def __init__(self, songs_dir):
-        self.songs_dir = songs_dir
-
-    def get_songs(self):
-        songs = []
-        for root, _, files in os.walk(self.songs_dir):
-            for file in files:
-                if file.endswith(".mp3"):
-                    try:
-                        MP3(os.path.join(root, file))
-                        songs.append(Song(os.path.join(root, file)))
-                    except:
-                        print(f"Error reading {file}, skipping...")
-                        messagebox.showerror("Error", f"Error reading {file}, skipping...")
-        return songs
-
-    def change_folder(self, new_folder):
-        self.songs_dir = new_folder
+        if self._hits:
+            self._hit_index = (self._hit_index - 1) % len(self._hits)
+            self.show_hit()
 
 class SongGuesser:
     def __init__(self, master):
         self.master = master
-        self.last_choices = []
-        self.num_songs_to_exclude = -10
+        self.num_songs_to_exclude = 10
         master.title("Song Guesser")
         master.resizable(False, False)
         try:
             master.iconbitmap("data/logo.ico")
         except:
             print("Warning: 'data/logo.ico' not found. Icon not set.")
-        self.song_library = SongLibrary("music")
-        pygame.mixer.init()
+        self.config = ConfigStore()
         try:
-            with open("data/config.json", "r") as f:
-                config = json.load(f)
-                if "volume" in config:
-                    pygame.mixer.music.set_volume(config["volume"] / 100)
-                else:
-                    pygame.mixer.music.set_volume(1)
+            self.config.load()
         except Exception as e:
             print(f"Error loading config.json: {e}")
             messagebox.showerror("Error", "Error loading configuration. Using default settings.")
+        self.audio = AudioEngine(self.config.get("volume", 100) / 100, self.config.get("audio_buffer", 512),
+                                 effects={"correct": "data/correct.mp3", "incorrect": "data/incorrect.mp3"},
+                                 effects_volume=self.config.get("effects_volume", 0.2))
+        self.scan_report = None
+        self.scan_polling = False
+        self.scan_done = False
+        self.scan_progress = 0
+        self.loudness_analyzer = None
+        self.song_library = SongLibrary("music", on_error=self.show_song_error,
+                                        workers=self.config.get("scan_workers"),
+                                        min_ready=self.config.get("library_min_ready", 20))
+        self.library_watcher = create_watcher(self.song_library)
+        self.pending_round = None
+        self.song_library.add_listener(self.invalidate_fragments)
+        self.round_builder = RoundBuilder(self.song_library, self.num_songs_to_exclude, self.config.get("hard_distractors", 0.0))
+        self.round_queue = RoundQueue(self.round_builder.build_round,
+                                      depth=self.config.get("prefetch_depth", 3),
+                                      workers=self.config.get("prefetch_workers", 2))
+
+        self.input_mode = False
+        self.screens_built = False
+        self.first_frame = None
 
         # Appearance settings
         ctk.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
@@ -158,10 +143,52 @@ class SongGuesser:
         self.options_button = ctk.CTkButton(master, text="Options", command=self.show_buttons_options, width=185, height=40)
         self.options_button.grid(row=2, column=1, columnspan=1, pady=5, padx=5, sticky="ew")
 
-        # Options screen    
+        # Only the menu is built up front, everything else waits until it is on screen
+        master.bind("<Map>", self.on_first_frame, add="+")
+
+    def on_first_frame(self, event):
+        if event.widget is not self.master or self.first_frame is not None:
+            return
+        self.first_frame = time.perf_counter()
+        self.master.after_idle(self.warm_up)
+
+    @tracing.traced("startup.warm_up")
+    def warm_up(self):
+        # Runs in idle time once the menu is showing: audio, fragment cache, library scan and the other screens
+        self.audio.start()
+        self.master.after(20, self.poll_audio)
+        disk_cache_mb = self.config.get("fragment_disk_cache_mb", 0)
+        with tracing.span("startup.fragment_cache"):
+            SongFragment.cache = FragmentCache(max_bytes=self.config.get("fragment_cache_mb", 64) * 1024 * 1024,
+                                               disk_dir="data/cache" if disk_cache_mb else None,
+                                               max_disk_bytes=disk_cache_mb * 1024 * 1024)
+        if self.config.get("normalize_loudness", True) and loudness.available():
+            normalizer = loudness.Normalizer(self.config.get("loudness_target", -16.0), self.config.get("energetic_starts", False))
+            SongFragment.normalizer = normalizer
+            self.loudness_analyzer = loudness.LoudnessAnalyzer(self.song_library.index, normalizer,
+                                                               self.config.get("loudness_workers"))
+        pack_path = self.config.get("round_pack", "data/rounds.pack")
+        if pack_path and os.path.exists(pack_path):
+            try:
+                SongFragment.pack = RoundPack(pack_path)
+            except (OSError, ValueError) as e:
+                print(f"Warning: round pack '{pack_path}' could not be opened: {e}")
+        self.build_screens()
+
+    def build_screens(self):
+        if self.screens_built:
+            return
+        self.screens_built = True
+        self.build_options_screen()
+        self.scan_library()
+        self.build_game_screen()
+
+    @tracing.traced("startup.options_screen")
+    def build_options_screen(self):
+        master = self.master
         self.sound_slider = ctk.CTkSlider(master, from_=0, to=100)
         self.sound_slider.grid(row=1, column=0, columnspan=2, ipady=10, padx=10, sticky="ew")
-        self.sound_slider.configure(command=lambda x: [pygame.mixer.music.set_volume(float(x)/100), self.sound_slider_amount.configure(text=f"Volume: {round(x)}%")])
+        self.sound_slider.configure(command=lambda x: [self.audio.set_volume(float(x)/100), self.sound_slider_amount.configure(text=f"Volume: {round(x)}%")])
         self.sound_slider.grid_remove()
         
         self.sound_slider_amount = ctk.CTkLabel(master, text=f"Volume: {round(self.sound_slider.get())}%", width=100, height=40, font=("Arial", 20))
@@ -172,8 +199,6 @@ class SongGuesser:
         self.input_mode_switch.grid(row=2, column=0, columnspan=2, pady=10, padx=10, sticky="ew")
         self.input_mode_switch.grid_remove()
         
-        self.input_mode = False
-        
         self.last_songs_label = ctk.CTkLabel(master, text="Pick how many song backwards do you want to not see while playing:", width=250, height=40)
         self.last_songs_label.grid(row=3, column=0, columnspan=2)
         self.last_songs_label.grid_remove()
@@ -186,19 +211,37 @@ class SongGuesser:
         self.last_songs_button.grid(row=5, column=0, columnspan=2, pady=10, padx=10, sticky="ew")
         self.last_songs_button.grid_remove()
 
-        self.download_button = ctk.CTkButton(master, text="Download songs", command=main, width=250, height=40)
+        self.download_button = ctk.CTkButton(master, text="Download songs", command=self.open_downloader, width=250, height=40)
         self.download_button.grid(row=6, column=0, columnspan=2, pady=10, padx=10, sticky="ew")
         self.download_button.grid_remove()
 
-        self.folder_select_button = ctk.CTkButton(master, text="Select music folder", command=lambda: [self.song_library.change_folder(filedialog.askdirectory(initialdir = "music")), self.save_game_state()], width=250, height=40)
+        self.folder_select_button = ctk.CTkButton(master, text="Select music folder", command=lambda: [self.select_folder(), self.save_game_state()], width=250, height=40)
         self.folder_select_button.grid(row=7, column=0, columnspan=2, pady=10, padx=10, sticky="ew")
         self.folder_select_button.grid_remove()
 
+        self.scan_label = ctk.CTkLabel(master, text="", width=250, height=20)
+        self.scan_label.grid(row=9, column=0, columnspan=2)
+        self.scan_label.grid_remove()
+
+        self.overlay_switch = ctk.CTkSwitch(master, text="Performance overlay", command=self.toggle_overlay)
+        self.overlay_switch.grid(row=10, column=0, columnspan=2, pady=10, padx=10, sticky="ew")
+        self.overlay_switch.grid_remove()
+
+        # Floats over whichever screen is shown, refreshed twice a second while on
+        self.overlay_label = ctk.CTkLabel(master, text="", font=("Courier", 10), justify="left", anchor="w",
+                                          fg_color=("gray90", "gray15"), corner_radius=4)
+        self.overlay_polling = False
+        if self.config.get("performance_overlay", False):
+            self.overlay_switch.select()
+            self.toggle_overlay()
+
         self.back_button_opt = ctk.CTkButton(master, text="Back", command=lambda: [self.show_buttons_menu(), self.save_game_state()], width=250, height=40) 
         self.back_button_opt.grid(row=8, column=0, columnspan=2, pady=10, padx=10, sticky="ew")
         self.back_button_opt.grid_remove()
 
-        # Game screen
+    @tracing.traced("startup.game_screen")
+    def build_game_screen(self):
+        master = self.master
         self.score = ctk.StringVar()
         self.score.set("0")
         self.score_label = ctk.CTkLabel(master, textvariable=self.score, width=300, height=40)
@@ -237,6 +280,79 @@ class SongGuesser:
         self.replay_button.grid(row=5, column=0, pady=5, padx=5, sticky="ew")
         self.replay_button.grid_remove()
 
+    def open_downloader(self):
+        # The downloader and spotdl are only loaded when asked for
+        from downloader import main
+        main(self.song_library.apply_changes, self.config.get("download_workers", 2), self.config.get("download_batch_size", 10))
+
+    def invalidate_fragments(self, changed, removed):
+        if changed is None:
+            return
+        for song in changed:
+            SongFragment.cache.invalidate(song.filepath)
+        for path in removed:
+            SongFragment.cache.invalidate(path)
+
+    def show_song_error(self, file, error):
+        print(f"Error reading {file}, skipping...")
+
+    def select_folder(self):
+        folder = filedialog.askdirectory(initialdir = "music")
+        if folder:
+            self.song_library.change_folder(folder)
+            self.scan_library()
+
+    def scan_library(self):
+        self.library_watcher.stop()
+        self.scan_progress = 0
+        self.scan_done = False
+        self.scan_label.configure(text="Scanning music folder...")
+        self.song_library.scan_async(on_progress=self.set_scan_progress, on_done=self.finish_scan)
+        if not self.scan_polling:
+            self.scan_polling = True
+            self.master.after(100, self.poll_scan)
+
+    def set_scan_progress(self, count):
+        self.scan_progress = count
+
+    def finish_scan(self, table, report):
+        if table is None:
+            # A newer scan replaced this one
+            return
+        self.library_watcher.start(self.song_library.songs_dir)
+        if self.loudness_analyzer is not None:
+            # Known levels apply right away, the analyzer then measures whatever is new or changed
+            SongFragment.normalizer.load(self.song_library.index, self.song_library.songs_dir)
+            self.loudness_analyzer.start(self.song_library.songs_dir)
+        self.scan_progress = len(table)
+        self.scan_report = report
+        self.scan_finished = time.perf_counter()
+        self.scan_done = True
+
+    def poll_scan(self):
+        if self.scan_done:
+            self.scan_polling = False
+            report = self.scan_report
+            self.scan_label.configure(text=f"Library ready: {self.scan_progress} songs ({round(report.rate)} files/s)")
+            print(f"Scanned {report.files} files in {report.elapsed:.1f} s, {report.parsed} parsed, {len(report.errors)} errors")
+            if report.errors:
+                messagebox.showerror("Error", report.summary())
+            if self.loudness_analyzer is not None:
+                self.master.after(500, self.poll_loudness)
+        else:
+            self.scan_label.configure(text=f"Scanning music folder... {self.scan_progress} files")
+            self.master.after(100, self.poll_scan)
+
+    def poll_loudness(self):
+        analyzer = self.loudness_analyzer
+        thread = analyzer.thread
+        measuring = thread is not None and thread.is_alive()
+        if analyzer.total:
+            status = f"measuring loudness {analyzer.done}/{analyzer.total}" if measuring else "loudness measured"
+            self.scan_label.configure(text=f"Library ready: {self.scan_progress} songs, {status}")
+        if measuring:
+            self.master.after(500, self.poll_loudness)
+
     def show_buttons_game(self):
         self.start_button.grid_remove()
         self.music_logo_label.grid_remove()
@@ -269,6 +385,8 @@ class SongGuesser:
         self.sound_slider.grid_remove()
         self.replay_button.grid_remove()
         self.folder_select_button.grid_remove()
+        self.scan_label.grid_remove()
+        self.overlay_switch.grid_remove()
         self.download_button.grid_remove()
         self.last_songs_button.grid_remove()
         self.last_songs_entry.grid_remove()
@@ -282,12 +400,15 @@ class SongGuesser:
         self.options_button.grid()
 
     def show_buttons_options(self):
+        self.build_screens()
         self.start_button.grid_remove()
         self.music_logo_label.grid_remove()
         self.options_button.grid_remove()
         self.sound_slider.grid()
         self.back_button_opt.grid()
         self.folder_select_button.grid()
+        self.scan_label.grid()
+        self.overlay_switch.grid()
         self.download_button.grid()
         self.last_songs_label.grid()
         self.last_songs_entry.grid()
@@ -296,49 +417,63 @@ class SongGuesser:
         self.input_mode_switch.grid()
     
     def play_game(self):
+        clicked = time.perf_counter()
+        self.build_screens()
         self.show_buttons_game_input_mode() if self.input_mode else self.show_buttons_game()
-        self.play_song()
+        self.play_song(clicked)
         
     def toggle_input_mode(self):
         self.input_mode = self.input_mode_switch.get()
 
-    def get_song_suggestions(self, text):
-        suggestions = []
-        for song in self.song_library.get_songs():
-            if text.lower() in song.title.lower():
-                suggestions.append(song.title)
-        return suggestions
+    def toggle_overlay(self):
+        shown = bool(self.overlay_switch.get())
+        tracing.enable(shown)
+        self.config.set("performance_overlay", shown)
+        if shown:
+            self.overlay_label.place(relx=0, rely=1, anchor="sw")
+            if not self.overlay_polling:
+                self.overlay_polling = True
+                self.master.after(500, self.poll_overlay)
+        else:
+            self.overlay_label.place_forget()
+
+    def poll_overlay(self):
+        if not tracing.enabled:
+            self.overlay_polling = False
+            return
+        cache = SongFragment.cache
+        lines = [tracing.summary(8) or "No spans recorded yet"]
+        if cache is not None:
+            lines.append(f"fragment cache: {cache.hits} hits, {cache.disk_hits} disk hits, {cache.misses} misses")
+        self.overlay_label.configure(text="\n".join(lines))
+        self.overlay_label.lift()
+        self.master.after(500, self.poll_overlay)
 
     def check_answer_input(self):
+        clicked = time.perf_counter()
         entered_title = self.song_entry.get()
-        correct_song = str(self.correct_song.title)
-        correct_song = correct_song.split(" - ")[0]
-        if entered_title.lower() == correct_song.lower():
+        # Answers stay closed until the next round is on, another Confirm would score this one again
+        self.confirm_button.configure(state=ctk.DISABLED)
+        self.song_entry.configure(state=ctk.DISABLED)
+        answers = self.song_library.get_answer_index()
+        if answers.is_correct(entered_title, self.correct_song.key, self.config.get("answer_tolerance", 2)):
             self.score.set(str(int(self.score.get()) + 1))
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load("data/correct.mp3")
-            pygame.mixer.music.set_volume(0.1)
-            pygame.mixer.music.play()
-            with open("data/config.json", "r") as f:
-                config = json.load(f)
-                if "volume" in config:
-                    pygame.mixer.music.set_volume(config["volume"] / 100)
-                else:
-                    pygame.mixer.music.set_volume(1)
-            root.update_idletasks()
+            self.audio.effect("correct", clicked=clicked)
         else:
+            self.audio.effect("incorrect", clicked=clicked)
             print(f"Wrong! The correct answer was {self.correct_song.title}")
             messagebox.showinfo("Wrong!", f"The correct answer was {self.correct_song.title}")
-        self.last_choices.append(self.correct_song)
-        self.play_song()
+        # The next round starts once this click has been handled
+        self.master.after_idle(self.play_song, clicked)
         
     def save_num_songs_to_exclude(self):
-        self.num_songs_to_exclude = int("-" + self.last_songs_entry.get())
+        self.num_songs_to_exclude = int(self.last_songs_entry.get())
+        self.round_builder.set_window(self.num_songs_to_exclude)
     
     def save_picked_number(self):
         try:
-            picked_number = int("-" + self.last_songs_entry.get())
-            if picked_number >= 0:
+            picked_number = int(self.last_songs_entry.get())
+            if picked_number <= 0:
                 raise ValueError("Number of songs to exclude must be positive.")
             self.picked_number = picked_number
             self.save_num_songs_to_exclude()
@@ -347,105 +482,134 @@ class SongGuesser:
             messagebox.showerror("Invalid Input", "Please enter a positive integer for the number of songs to exclude.")
 
     def save_game_state(self):
-        game_state = {
-            "volume": round(self.sound_slider.get())
-        }
-
-        with open("data/config.json", "w") as f:
-            json.dump(game_state, f)
-
-    def get_random_choices(self, songs, correct_song):
-        choices = [correct_song]
-        while len(choices) < 4:
-            random_song = random.choice(songs)
-            if not any(c.title == random_song.title and c.album == random_song.album for c in choices):
-                choices.append(random_song)
-        random.shuffle(choices)
-        return choices
+        self.config.set("volume", round(self.sound_slider.get()))
 
     def check_answer(self, choice_index):
+        clicked = time.perf_counter()
         with self.choices_lock:
-            if self.choices[choice_index] == self.correct_song:
+            if self.choices[choice_index] == self.correct_song.id:
                 self.score.set(str(int(self.score.get()) + 1))
-                pygame.mixer.music.stop()
-                pygame.mixer.music.load("data/correct.mp3")
-                pygame.mixer.music.set_volume(0.1)
-                pygame.mixer.music.play()
-                with open("data/config.json", "r") as f:
-                    config = json.load(f)
-                    if "volume" in config:
-                        pygame.mixer.music.set_volume(config["volume"] / 100)
-                    else:
-                        pygame.mixer.music.set_volume(1)
-                root.update_idletasks()
+                self.audio.effect("correct", clicked=clicked)
             else:
+                self.audio.effect("incorrect", clicked=clicked)
                 print(f"Wrong! The correct answer was {self.correct_song.title}")
                 messagebox.showinfo("Wrong!", f"The correct answer was {self.correct_song.title}")
-        self.last_choices.append(self.correct_song)
-        self.play_song()
-
-    def update_options(self):
-        new_choices = self.get_random_choices(self.song_library.get_songs(), self.correct_song)
-        with self.choices_lock:
-            self.choices = new_choices
-        for i, choice in enumerate(self.choices): 
-            self.options[i].configure(text=f"{choice.title}   ({choice.album})" if choice.album or choice.album != None else choice.title)
+        self.master.after_idle(self.play_song, clicked)
+
+    @tracing.traced("ui.update_options")
+    def update_options(self, labels):
+        for i, label in enumerate(labels): 
+            self.options[i].configure(text=label)
+        for option in self.options[len(labels):]:
+            option.configure(text="", state=ctk.DISABLED)
        
-    def play_song(self):
-        if os.path.exists("data/temp.mp3"):
-            os.remove("data/temp.mp3")
-        songs = self.song_library.get_songs()
-        if not songs:
+    @tracing.traced("ui.play_song")
+    def play_song(self, clicked=None):
+        if self.song_library.is_loaded() and not len(self.song_library.table):
             print("No valid MP3 files found in the selected directory.")
             messagebox.showerror("Error", "No valid MP3 files found in the selected directory.")
             return
 
-        random.seed(int(time.time() * 1000))
-        self.correct_song = random.choice(songs)
-        if self.correct_song in self.last_choices[-self.num_songs_to_exclude:]:
-            self.correct_song = random.choice(songs)
+        self.round_queue.start()
+        next_round = self.round_queue.get()
+        while next_round is not None and next_round.folder != self.song_library.songs_dir:
+            next_round = self.round_queue.get()
+        if next_round is None:
+            if self.song_library.is_loaded() and self.round_queue.failures >= 3:
+                self.pending_round = None
+                print("No playable songs found in the selected directory.")
+                messagebox.showerror("Error", "None of the songs in the selected directory could be played.")
+                return
+            # The workers are still preparing the first rounds
+            tracing.count("round.queue_empty")
+            for option in self.options:
+                option.configure(state=ctk.DISABLED)
+            self.confirm_button.configure(state=ctk.DISABLED)
+            self.song_entry.configure(state=ctk.DISABLED)
+            self.pending_round = self.master.after(50, self.play_song, clicked)
+            return
+        self.pending_round = None
 
-        threading.Thread(target=self.update_options).start()
+        with self.choices_lock:
+            self.correct_song = next_round.song
+            self.choices = next_round.choices
+        self.update_options(next_round.labels)
         
         if self.input_mode:
-            self.song_entry.set_completion_list([song.title for song in self.song_library.get_songs()])
+            self.song_entry.set_search_index(self.song_library.get_title_index(), self.song_library.get_answer_index())
         
-        try:
-            song_fragment = SongFragment(self.correct_song)
-            fragment = song_fragment.fragment_data
-            if fragment:
-                with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-                    temp_filename = f.name
-                    f.write(fragment)
-                pygame.mixer.music.load(temp_filename)
-                pygame.mixer.music.play()
-                self.pause_button.configure(state=ctk.NORMAL)
-                for option in self.options:
-                    option.configure(state=ctk.NORMAL)
-            else:
-                print(f"Error playing {self.correct_song.filepath}. Skipping...")
-        except Exception as e:
-            print(f"Error playing song: {e}")
+        # Decoding and starting the clip happen on the audio thread, it reports back through poll_audio
+        self.audio.load(next_round.fragment, clicked=clicked)
+        self.audio.play(clicked=clicked)
+        self.pause_button.configure(state=ctk.NORMAL, text="Pause")
+        for option in self.options[:len(self.choices)]:
+            option.configure(state=ctk.NORMAL)
+        self.confirm_button.configure(state=ctk.NORMAL)
+        self.song_entry.configure(state=ctk.NORMAL)
+
+    def poll_audio(self):
+        self.audio.poll(self.handle_audio_event)
+        self.master.after(20, self.poll_audio)
+
+    def handle_audio_event(self, name, value):
+        if name == "paused":
+            self.pause_button.configure(text="Resume" if value else "Pause")
+        elif name == "started":
+            self.pause_button.configure(text="Pause")
+        elif name == "error":
+            print(f"Error playing song: {value}")
             messagebox.showerror("Error", "Error playing song.")
 
     def pause_song(self):
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.pause()
-            self.pause_button.configure(text="Resume")
-        else:
-            pygame.mixer.music.unpause()
-            self.pause_button.configure(text="Pause")
+        self.audio.pause()
 
     def replay_song(self):
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
-        pygame.mixer.music.play()
+        self.audio.replay(clicked=time.perf_counter())
     
     def stop_song(self):
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
+        if self.pending_round is not None:
+            self.master.after_cancel(self.pending_round)
+            self.pending_round = None
+        self.audio.halt()
         
-root = ctk.CTk()
-guesser = SongGuesser(root)
-root.mainloop()
-pygame.mixer.quit() 
\ No newline at end of file
+def report_startup(root, guesser, waited=0):
+    # Waits for the library scan as well, then prints every import and startup stage in the order they ran
+    if (guesser.first_frame is None or not guesser.scan_done) and waited < 10000:
+        root.after(20, report_startup, root, guesser, waited + 20)
+        return
+    for name, histogram in list(tracing.histograms.items()):
+        if name.startswith(("import.", "startup.")):
+            print(f"{name:24} {histogram.total * 1000:8.1f} ms")
+    if guesser.first_frame is not None:
+        print(f"{'time to first frame':24} {(guesser.first_frame - STARTED) * 1000:8.1f} ms (target 300 ms)")
+    if guesser.scan_done:
+        print(f"{'library ready':24} {(guesser.scan_finished - STARTED) * 1000:8.1f} ms, {guesser.scan_progress} songs")
+    root.destroy()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Song Guesser")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import and startup timings once the menu and library are ready, then quit")
+    args = parser.parse_args()
+    if not os.path.exists("data/config.json"):
+        import setup
+        setup.create_defaults()
+    with tracing.span("startup.window"):
+        root = ctk.CTk()
+    with tracing.span("startup.menu"):
+        guesser = SongGuesser(root)
+    if args.profile_startup:
+        report_startup(root, guesser)
+    root.mainloop()
+    guesser.library_watcher.stop()
+    guesser.round_queue.stop()
+    if guesser.loudness_analyzer is not None:
+        guesser.loudness_analyzer.stop()
+    guesser.audio.stop()
+    guesser.config.flush()
+    if tracing.enabled and not args.profile_startup:
+        tracing.dump("data/trace.json")
+    latency = guesser.audio.latency_stats()
+    if latency:
+        print(f"Click to audible start: p50 {latency[0] * 1000:.0f} ms, p99 {latency[1] * 1000:.0f} ms")
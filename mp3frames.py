@@ -0,0 +1,204 @@
+import mmap
+import struct
+
+BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+class FrameHeader:
+    def __init__(self, version, bitrate, sample_rate, padding, mono, protected=False):
+        self.version = version
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.mono = mono
+        self.protected = protected
+        if version == 3:
+            self.samples = 1152
+            self.length = 144 * bitrate // sample_rate + padding
+            self.side_info = 17 if mono else 32
+        else:
+            self.samples = 576
+            self.length = 72 * bitrate // sample_rate + padding
+            self.side_info = 9 if mono else 17
+
+    @property
+    def duration(self):
+        return self.samples / self.sample_rate
+
+def parse_header(data, offset):
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    # Only Layer III, no free-format or reserved values
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    return FrameHeader(version, bitrate, SAMPLE_RATES[version][rate_index], (b2 >> 1) & 1, b3 >> 6 == 3, not b1 & 1)
+
+def skip_id3(data):
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return size + (20 if data[5] & 0x10 else 10)
+
+def sync(data, offset, limit=65536):
+    # A sync word only counts if the following frame starts right where this one ends
+    end = min(len(data) - 4, offset + limit)
+    while offset < end:
+        offset = data.find(b"\xff", offset, end)
+        if offset < 0:
+            return None
+        header = parse_header(data, offset)
+        if header is not None:
+            following = offset + header.length
+            if following >= len(data) or parse_header(data, following) is not None:
+                return offset, header
+        offset += 1
+    return None
+
+class MP3Stream:
+    def __init__(self, data):
+        self.data = data
+        found = sync(data, skip_id3(data))
+        if found is None:
+            raise ValueError("No MPEG audio frames found")
+        self.first_frame, header = found
+        self.header = header
+        self.audio_start = self.first_frame
+        self.audio_end = len(data)
+        if data[-128:-125] == b"TAG":
+            self.audio_end -= 128
+        self.frames = None
+        self.total_bytes = None
+        self.toc = None
+        self.vbri = None
+        self.read_vbr_header()
+        if self.frames:
+            self.duration = self.frames * header.duration
+        else:
+            self.duration = (self.audio_end - self.audio_start) * 8 / header.bitrate
+
+    def read_vbr_header(self):
+        data = self.data
+        header = self.header
+        xing = self.first_frame + 4 + header.side_info
+        if data[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack_from(">I", data, xing + 4)[0]
+            position = xing + 8
+            if flags & 1:
+                self.frames = struct.unpack_from(">I", data, position)[0]
+                position += 4
+            if flags & 2:
+                self.total_bytes = struct.unpack_from(">I", data, position)[0]
+                position += 4
+            if flags & 4:
+                self.toc = bytes(data[position:position + 100])
+            self.audio_start = self.first_frame + header.length
+            return
+        vbri = self.first_frame + 4 + 32
+        if data[vbri:vbri + 4] == b"VBRI":
+            self.total_bytes, self.frames, entries, scale, entry_size, frames_per_entry = struct.unpack_from(">IIHHHH", data, vbri + 10)
+            position = vbri + 26
+            sizes = []
+            for _ in range(entries):
+                sizes.append(int.from_bytes(data[position:position + entry_size], "big") * scale)
+                position += entry_size
+            self.vbri = (sizes, frames_per_entry * header.duration)
+            self.audio_start = self.first_frame + header.length
+
+    def seek_offset(self, seconds):
+        # Estimates the byte position of a timestamp from the Xing/VBRI table of contents, or the bitrate for CBR files
+        audio_bytes = self.total_bytes or self.audio_end - self.audio_start
+        if self.toc is not None and self.duration:
+            percent = min(max(seconds * 100 / self.duration, 0), 99.999)
+            index = int(percent)
+            lower = self.toc[index]
+            upper = self.toc[index + 1] if index < 99 else 256
+            return self.first_frame + int((lower + (upper - lower) * (percent - index)) / 256 * audio_bytes)
+        if self.vbri is not None:
+            sizes, entry_duration = self.vbri
+            offset = self.audio_start
+            for size in sizes:
+                if seconds < entry_duration:
+                    return offset + int(size * seconds / entry_duration)
+                seconds -= entry_duration
+                offset += size
+            return offset
+        if self.frames and self.total_bytes:
+            return self.audio_start + int(seconds / self.duration * audio_bytes)
+        return self.audio_start + int(seconds * self.header.bitrate / 8)
+
+    def cut(self, start, length):
+        found = sync(self.data, self.seek_offset(start))
+        if found is None:
+            return None
+        begin, header = found
+        end = begin
+        elapsed = 0
+        while elapsed < length and header is not None and end + header.length <= self.audio_end:
+            elapsed += header.duration
+            end += header.length
+            header = parse_header(self.data, end)
+        if end == begin:
+            return None
+        return bytes(self.data[begin:end])
+
+def cut_file(filepath, start, length):
+    with open(filepath, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return MP3Stream(data).cut(start, length)
+
+def crc16(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005 if crc & 0x8000 else crc << 1) & 0xFFFF
+    return crc
+
+def apply_gain(data, steps):
+    # Shifts every granule's global_gain like mp3gain does: 1.5 dB per step, no decoding and no quality loss
+    if not steps:
+        return data
+    out = bytearray(data)
+    # Clips rendered by ffmpeg start with an ID3 tag, the frames follow it
+    found = sync(out, skip_id3(out))
+    if found is None:
+        return data
+    offset = found[0]
+    while True:
+        header = parse_header(out, offset)
+        if header is None or offset + header.length > len(out):
+            break
+        side = offset + (6 if header.protected else 4)
+        channels = 1 if header.mono else 2
+        if header.version == 3:
+            # main_data_begin, private bits and scfsi come first, then 59 bits per granule and channel
+            bit = 9 + (5 if header.mono else 3) + 4 * channels
+            fields, width = 2 * channels, 59
+        else:
+            bit = 8 + (1 if header.mono else 2)
+            fields, width = channels, 63
+        for _ in range(fields):
+            # global_gain sits after part2_3_length (12 bits) and big_values (9 bits)
+            position = side * 8 + bit + 21
+            byte, shift = position >> 3, 8 - (position & 7)
+            word = (out[byte] << 8) | out[byte + 1]
+            gain = min(255, max(0, ((word >> shift) & 0xFF) + steps))
+            word = (word & ~(0xFF << shift) & 0xFFFF) | (gain << shift)
+            out[byte] = word >> 8
+            out[byte + 1] = word & 0xFF
+            bit += width
+        if header.protected:
+            # The checksum covers the last two header bytes and the side information
+            crc = crc16(out[offset + 2:offset + 4] + out[side:side + header.side_info])
+            out[offset + 4] = crc >> 8
+            out[offset + 5] = crc & 0xFF
+        offset += header.length
+    return bytes(out)
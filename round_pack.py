@@ -0,0 +1,266 @@
+import argparse
+import io
+import json
+import mmap
+import os
+import random
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from fragment import SongFragment
+from library import Song, SongLibrary
+from scanner import create_executor
+
+# A round pack is one file: header, then the fragments back to back, then the offset table and the song paths.
+# The table is written last, so a pack without a valid header is an unfinished build.
+MAGIC = b"SGPK"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ")   # magic, version, fragment length, entry count, table offset, paths offset
+ENTRY = struct.Struct("<QIIqQII")    # data offset, data length, start, song mtime_ns, song size, path offset, path length
+BATCH_SIZE = 16
+
+def encode_path(path):
+    return os.path.normpath(path).encode("utf-8", "surrogateescape")
+
+class RoundPack:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{path} is empty")
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a finished round pack")
+        magic, version, self.length, count, table_offset, paths_offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or not table_offset or table_offset + count * ENTRY.size > len(self.map):
+            self.close()
+            raise ValueError(f"{path} is not a finished round pack")
+        self.view = memoryview(self.map)
+        # Entries are grouped by song, songs maps each path to the range of its entries
+        self.entries = list(ENTRY.iter_unpack(self.map[table_offset:table_offset + count * ENTRY.size]))
+        self.songs = {}
+        for i, entry in enumerate(self.entries):
+            path = self.map[paths_offset + entry[5]:paths_offset + entry[5] + entry[6]].decode("utf-8", "surrogateescape")
+            first, last = self.songs.get(path, (i, i))
+            self.songs[path] = (first, i + 1)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        self.view = None
+        try:
+            self.map.close()
+        except BufferError:
+            # A fragment is still playing from the pack, the mapping goes away with its last slice
+            pass
+        self.file.close()
+
+    def fragments(self, path):
+        # (start, mtime_ns, size, slice) for every fragment of a song, the slices point into the mapped file
+        first, last = self.songs.get(os.path.normpath(path), (0, 0))
+        return [(entry[2], entry[3], entry[4], self.view[entry[0]:entry[0] + entry[1]]) for entry in self.entries[first:last]]
+
+    def pick(self, path, rng=random):
+        # A random fragment of the song, or None when it is not in the pack or the file changed since the build
+        first, last = self.songs.get(os.path.normpath(path), (0, 0))
+        if first == last:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self.entries[rng.randrange(first, last)]
+        if entry[3] != stat.st_mtime_ns or entry[4] != stat.st_size:
+            return None
+        return entry[2], self.view[entry[0]:entry[0] + entry[1]]
+
+def pick_starts(path, duration, count, length, seed):
+    # Seeded per song so a resumed or repeated build picks the same clips
+    rng = random.Random(f"{seed}:{os.path.normpath(path)}")
+    starts = range(10, max(10, int(duration - length - 10)) + 1)
+    return sorted(rng.sample(starts, min(count, len(starts))))
+
+def render_batch(batch, count, length, seed):
+    results = []
+    for path, title, duration in batch:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        song = Song(path, title, duration=duration)
+        fragments = []
+        for start in pick_starts(path, duration, count, length, seed):
+            data = SongFragment(song, length, start).fragment_data
+            if data:
+                fragments.append((start, data))
+        results.append((path, stat.st_mtime_ns, stat.st_size, fragments))
+    return results
+
+class PackBuilder:
+    def __init__(self, output, count=3, length=10, seed=0):
+        self.output = output
+        self.count = count
+        self.length = length
+        self.seed = seed
+        self.partial = output + ".partial"
+        self.journal_path = output + ".journal"
+        self.records = []
+        self.done = set()
+
+    def open(self):
+        # Picks up an interrupted build: everything named in the journal is kept, the data file is cut back to match
+        end = HEADER.size
+        if os.path.exists(self.partial) and os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8", errors="surrogateescape") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record[0] == "settings":
+                        if record[1:] != [self.count, self.length, self.seed]:
+                            break
+                        continue
+                    path, mtime, size, fragments = record
+                    self.records.extend([path, mtime, size] + fragment for fragment in fragments)
+                    self.done.add(path)
+            end = max([record[4] + record[5] for record in self.records] or [HEADER.size])
+        if not self.done:
+            with open(self.partial, "wb") as f:
+                f.write(b"\0" * HEADER.size)
+            with open(self.journal_path, "w") as f:
+                f.write(json.dumps(["settings", self.count, self.length, self.seed]) + "\n")
+        self.data = open(self.partial, "r+b")
+        self.data.truncate(end)
+        self.data.seek(end)
+        self.journal = open(self.journal_path, "a", encoding="utf-8", errors="surrogateescape")
+        return len(self.done)
+
+    def add(self, path, mtime, size, fragments):
+        placed = []
+        for start, data in fragments:
+            placed.append([start, self.data.tell(), len(data)])
+            self.data.write(data)
+        # One journal line per song, written after its data is on disk, so a crash can at worst render it again
+        self.data.flush()
+        self.journal.write(json.dumps([path, mtime, size, placed]) + "\n")
+        self.journal.flush()
+        self.records.extend([path, mtime, size] + fragment for fragment in placed)
+        self.done.add(path)
+
+    def finish(self):
+        records = sorted(self.records, key=lambda record: (record[0], record[3]))
+        paths = {}
+        blob = bytearray()
+        table = bytearray()
+        for path, mtime, size, start, offset, length in records:
+            if path not in paths:
+                encoded = encode_path(path)
+                paths[path] = (len(blob), len(encoded))
+                blob += encoded
+            table += ENTRY.pack(offset, length, start, mtime, size, *paths[path])
+        table_offset = self.data.seek(0, io.SEEK_END)
+        self.data.write(table)
+        self.data.write(blob)
+        self.data.seek(0)
+        self.data.write(HEADER.pack(MAGIC, VERSION, self.length, len(records), table_offset, table_offset + len(table)))
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        self.data.close()
+        self.journal.close()
+        os.replace(self.partial, self.output)
+        os.remove(self.journal_path)
+        return len(records)
+
+def reusable(pack, path, duration, count, length, seed):
+    # The song's fragments copied out of an older pack, if the file is unchanged and the same clips would be picked
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    fragments = pack.fragments(path)
+    if not fragments or [fragment[0] for fragment in fragments] != pick_starts(path, duration, count, length, seed):
+        return None
+    if any(fragment[1] != stat.st_mtime_ns or fragment[2] != stat.st_size for fragment in fragments):
+        return None
+    return stat.st_mtime_ns, stat.st_size, [(start, bytes(view)) for start, _, _, view in fragments]
+
+def build_pack(songs_dir, output, count=3, length=10, workers=None, processes=True, seed=0, on_progress=None):
+    # Songs already in the pack at the same mtime and size are copied over, only new and changed ones are rendered
+    table = SongLibrary(songs_dir).scan()
+    songs = [(table.paths[song_id], table.titles[song_id], table.durations[song_id]) for song_id in table.live_ids()]
+    songs = [song for song in songs if song[2] > length + 20]
+    builder = PackBuilder(output, count, length, seed)
+    resumed = builder.open()
+    old = None
+    if os.path.exists(output):
+        try:
+            old = RoundPack(output)
+        except ValueError:
+            old = None
+    if old is not None and old.length != length:
+        old.close()
+        old = None
+
+    todo = []
+    copied = 0
+    for path, title, duration in songs:
+        if path in builder.done:
+            continue
+        if old is not None:
+            reused = reusable(old, path, duration, count, length, seed)
+            if reused is not None:
+                builder.add(path, *reused)
+                copied += 1
+                continue
+        todo.append((path, title, duration))
+    if old is not None:
+        old.close()
+
+    rendered = 0
+    workers = workers or os.cpu_count() or 4
+    with create_executor(workers, processes) as executor:
+        pending = set()
+        batches = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
+        for batch in batches + [None]:
+            if batch is not None:
+                pending.add(executor.submit(render_batch, batch, count, length, seed))
+            # Writes happen here on one thread, a few batches per worker stay in flight
+            while pending and (batch is None or len(pending) >= workers * 4):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        builder.add(*result)
+                        rendered += 1
+                if on_progress:
+                    on_progress(resumed + copied + rendered, len(songs))
+    entries = builder.finish()
+    return {"songs": len(songs), "resumed": resumed, "copied": copied, "rendered": rendered, "fragments": entries}
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-renders random fragments of every song into one round pack the game plays from.")
+    parser.add_argument("folder", nargs="?", default="music", help="music folder (default: music)")
+    parser.add_argument("--output", default="data/rounds.pack")
+    parser.add_argument("--per-song", type=int, default=3, help="fragments rendered for each song")
+    parser.add_argument("--length", type=int, default=10, help="fragment length in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", action="store_true", help="render on threads instead of worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\r{done}/{total} songs", end="", flush=True)
+
+    result = build_pack(args.folder, args.output, args.per_song, args.length, args.workers, not args.threads, args.seed, progress)
+    print(f"\r{result['fragments']} fragments from {result['songs']} songs in {time.perf_counter() - started:.1f} s: "
+          f"{result['rendered']} rendered, {result['copied']} unchanged, {result['resumed']} resumed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import queue
+import random
+import threading
+
+import tracing
+from fragment import SongFragment
+from sampler import ChoiceSampler
+
+# Picks tried before a round is given up on, an unreadable song is skipped without waiting
+ATTEMPTS = 5
+
+class Round:
+    def __init__(self, song, choices, labels, fragment, folder=None):
+        self.song = song
+        self.choices = choices
+        self.labels = labels
+        self.fragment = fragment
+        self.folder = folder
+
+class RoundBuilder:
+    # The game logic behind a round, kept free of Tk and pygame so it can run headless
+    def __init__(self, library, window=10, hard_distractors=0.0, rng=random, length=10):
+        self.library = library
+        self.window = window
+        self.hard_distractors = hard_distractors
+        self.rng = rng
+        self.length = length
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.sampler_version = None
+
+    def set_window(self, size):
+        with self.lock:
+            self.window = size
+            if self.sampler is not None:
+                self.sampler.set_window(size)
+
+    def get_sampler(self, table):
+        # Rebuilt whenever the library changes, the recently played songs carry over
+        if self.sampler is None or self.sampler_version != self.library.version:
+            recent = self.sampler.recent_keys() if self.sampler is not None else []
+            # Songs need 10 s on either side of the clip, like the round pack builder requires
+            self.sampler = ChoiceSampler(table, self.window, self.hard_distractors, recent, self.rng, self.length + 20)
+            self.sampler_version = self.library.version
+        return self.sampler
+
+    def get_random_choices(self, table, correct_id):
+        choices = self.get_sampler(table).choices(correct_id)
+        self.rng.shuffle(choices)
+        return choices
+
+    @tracing.traced("round.build")
+    def build_round(self):
+        # Runs on the prefetch workers, the song pick is serialized so queued rounds respect the exclusion window too
+        for _ in range(ATTEMPTS):
+            with self.lock, self.library.lock, tracing.span("round.select"):
+                table = self.library.get_table()
+                if table is None or not len(table):
+                    return None
+                folder = self.library.songs_dir
+                correct_id = self.get_sampler(table).pick()
+                if correct_id is None:
+                    return None
+                choices = self.get_random_choices(table, correct_id)
+                correct_song = table.song(correct_id)
+                labels = [table.label(song_id) for song_id in choices]
+            fragment = SongFragment(correct_song, self.length).fragment_data
+            if fragment:
+                return Round(correct_song, choices, labels, fragment, folder)
+            print(f"Error playing {correct_song.filepath}. Skipping...")
+        return None
+
+class RoundQueue:
+    def __init__(self, build_round, depth=3, workers=2):
+        self.build_round = build_round
+        self.depth = max(1, depth)
+        self.workers = max(1, workers)
+        self.rounds = queue.Queue(maxsize=self.depth)
+        self.running = False
+        self.threads = []
+        self.idle = threading.Event()
+        # Rounds that could not be built in a row, the UI gives up waiting after a few
+        self.failures = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.idle.clear()
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.idle.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def run(self):
+        while self.running:
+            try:
+                round = self.build_round()
+            except Exception as e:
+                print(f"Error preparing round: {e}")
+                round = None
+            if round is None:
+                # Nothing to play yet (empty or unreadable library), back off instead of spinning
+                self.failures += 1
+                self.idle.wait(1)
+                continue
+            self.failures = 0
+            while self.running:
+                try:
+                    self.rounds.put(round, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+
+    def get(self, timeout=None):
+        # Non-blocking unless a timeout is given, the Tk loop polls while the session server waits in a worker thread
+        try:
+            if timeout is None:
+                return self.rounds.get_nowait()
+            return self.rounds.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        self.failures = 0
+        while self.get() is not None:
+            pass
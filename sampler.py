@@ -0,0 +1,112 @@
+import random
+from array import array
+from collections import deque
+
+class ChoiceSampler:
+    def __init__(self, table, window=10, hard_distractors=0.0, recent_keys=(), rng=random, min_duration=0):
+        self.table = table
+        self.rng = rng
+        self.hard_distractors = hard_distractors
+        # unique holds one song id per (title, album) pair, the sampler works on positions in it
+        positions = {}
+        self.unique = array("l")
+        self.positions = array("l", [-1]) * len(table.paths)
+        for song_id in table.live_ids():
+            key = (table.titles[song_id], table.albums[song_id])
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = len(self.unique)
+                self.unique.append(song_id)
+            self.positions[song_id] = position
+        self.albums = self.group(table.albums)
+        self.artists = self.group(table.artists)
+
+        # order is a permutation of the positions, recently played ones are kept at its tail
+        self.order = array("l", range(len(self.unique)))
+        self.slots = array("l", range(len(self.unique)))
+        self.available = len(self.unique)
+        # Songs too short for a clip are parked for good behind the recent ones, they still appear as wrong choices
+        for position, song_id in enumerate(self.unique):
+            if (table.durations[song_id] or 0) < min_duration:
+                self.exclude(position)
+        self.playable = self.available
+        self.recent = deque()
+        self.window = 0
+        self.set_window(window)
+        for key in recent_keys[-self.window:] if self.window else []:
+            position = positions.get(key)
+            if position is not None and self.slots[position] < self.available:
+                self.recent.append(position)
+                self.exclude(position)
+
+    def __len__(self):
+        return len(self.unique)
+
+    def group(self, column):
+        groups = {}
+        for position, song_id in enumerate(self.unique):
+            key = column[song_id]
+            if key is not None:
+                groups.setdefault(key, array("l")).append(position)
+        return {key: positions for key, positions in groups.items() if len(positions) > 1}
+
+    def swap(self, a, b):
+        position_a = self.order[a]
+        position_b = self.order[b]
+        self.order[a] = position_b
+        self.order[b] = position_a
+        self.slots[position_a] = b
+        self.slots[position_b] = a
+
+    def exclude(self, position):
+        self.available -= 1
+        self.swap(self.slots[position], self.available)
+
+    def release(self, position):
+        self.swap(self.slots[position], self.available)
+        self.available += 1
+
+    def set_window(self, size):
+        # At least one song always stays available, so picking can't run dry
+        self.window = max(0, min(size, self.playable - 1))
+        while len(self.recent) > self.window:
+            self.release(self.recent.popleft())
+
+    def recent_keys(self):
+        keys = []
+        for position in self.recent:
+            song_id = self.unique[position]
+            keys.append((self.table.titles[song_id], self.table.albums[song_id]))
+        return keys
+
+    def pick(self):
+        if not self.available:
+            return None
+        position = self.order[self.rng.randrange(self.available)]
+        if self.window:
+            self.recent.append(position)
+            self.exclude(position)
+            if len(self.recent) > self.window:
+                self.release(self.recent.popleft())
+        return self.unique[position]
+
+    def choices(self, correct_id, count=4):
+        correct = self.positions[correct_id]
+        chosen = [correct]
+        if self.hard_distractors:
+            for group in (self.albums.get(self.table.albums[correct_id]), self.artists.get(self.table.artists[correct_id])):
+                if not group:
+                    continue
+                for position in self.rng.sample(group, min(len(group), count)):
+                    if len(chosen) < count and position not in chosen and self.rng.random() < self.hard_distractors:
+                        chosen.append(position)
+        # Sampling enough distinct positions up front means the already chosen ones can simply be skipped
+        needed = min(count, len(self.unique)) - len(chosen)
+        if needed > 0:
+            for position in self.rng.sample(range(len(self.unique)), min(len(self.unique), needed + len(chosen))):
+                if position not in chosen:
+                    chosen.append(position)
+                    needed -= 1
+                    if not needed:
+                        break
+        return [correct_id] + [self.unique[position] for position in chosen[1:]]
@@ -0,0 +1,141 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from song_index import read_metadata
+
+BATCH_SIZE = 32
+
+class ScanReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.files = 0
+        self.parsed = 0
+        self.errors = []
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        return self.files / self.elapsed if self.elapsed else 0
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def summary(self, limit=10):
+        if not self.errors:
+            return ""
+        names = "\n".join(file for file, _ in self.errors[:limit])
+        more = f"\n...and {len(self.errors) - limit} more" if len(self.errors) > limit else ""
+        return f"{len(self.errors)} files could not be read and were skipped:\n{names}{more}"
+
+def walk_shard(folder, recursive=True):
+    files = []
+    folders = []
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return files, folders
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                folders.append(entry.path)
+            elif entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                files.append((os.path.normpath(entry.path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            continue
+    if recursive:
+        for subfolder in folders:
+            for root, _, names in os.walk(subfolder):
+                for name in names:
+                    if name.endswith(".mp3"):
+                        path = os.path.normpath(os.path.join(root, name))
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        files.append((path, stat.st_mtime_ns, stat.st_size))
+        folders = []
+    return files, folders
+
+def list_files(songs_dir, executor):
+    # The top level is listed here and every subfolder becomes its own shard for the pool
+    files, folders = walk_shard(songs_dir, recursive=False)
+    yield from files
+    pending = {executor.submit(walk_shard, folder) for folder in folders}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from future.result()[0]
+
+def parse_batch(batch):
+    rows = []
+    for path, mtime, size in batch:
+        try:
+            rows.append((path, mtime, size) + read_metadata(path) + (None,))
+        except Exception as e:
+            rows.append((path, mtime, size, None, None, None, None, None, str(e)))
+    return rows
+
+def scan_rows(index, songs_dir, report=None, on_progress=None, workers=None, processes=False):
+    # Yields song rows as soon as they are known, unchanged files straight from the index and the rest once parsed
+    report = report or ScanReport()
+    known = index.load(songs_dir)
+    seen = set()
+    changed = []
+    completed = False
+
+    def finished(futures):
+        for future in futures:
+            for row in future.result():
+                changed.append(row)
+                report.parsed += 1
+                if row[8] is None:
+                    yield row[0:1] + row[3:8]
+                else:
+                    report.errors.append((os.path.basename(row[0]), row[8]))
+
+    workers = workers or os.cpu_count() or 4
+    try:
+        with ThreadPoolExecutor(workers) as walkers, create_executor(workers, processes) as parsers:
+            pending = set()
+            batch = []
+            for path, mtime, size in list_files(songs_dir, walkers):
+                seen.add(path)
+                report.files += 1
+                if on_progress and report.files % 100 == 0:
+                    on_progress(report.files)
+                row = known.get(path)
+                if row is not None and row[1] == mtime and row[2] == size:
+                    if row[8] is None:
+                        yield row[0:1] + row[3:8]
+                    continue
+                batch.append((path, mtime, size))
+                if len(batch) == BATCH_SIZE:
+                    pending.add(parsers.submit(parse_batch, batch))
+                    batch = []
+                    # Keeps a few batches per worker in flight and hands out whatever is already parsed
+                    timeout = None if len(pending) >= workers * 4 else 0
+                    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    yield from finished(done)
+            if batch:
+                pending.add(parsers.submit(parse_batch, batch))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+        completed = True
+    finally:
+        # Files are only forgotten after a full walk, a scan that was cut short just keeps what it parsed
+        removed = [path for path in known if path not in seen] if completed else []
+        index.save(changed, removed)
+        report.finish()
+
+def create_executor(workers, processes=False):
+    if processes:
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(workers)
+    return ThreadPoolExecutor(workers)
@@ -0,0 +1,58 @@
+import bisect
+from array import array
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TitleIndex:
+    def __init__(self, titles):
+        self.titles = sorted(dict.fromkeys(str(title) for title in titles), key=str.lower)
+        self.keys = [title.lower() for title in self.titles]
+        self.trigrams = {}
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                postings = self.trigrams.get(gram)
+                if postings is None:
+                    postings = self.trigrams[gram] = array("I")
+                postings.append(i)
+        self.last_query = None
+        self.last_matches = None
+
+    def __len__(self):
+        return len(self.titles)
+
+    def prefix(self, query, limit=10):
+        query = query.lower()
+        hits = []
+        for i in range(bisect.bisect_left(self.keys, query), len(self.keys)):
+            if len(hits) == limit or not self.keys[i].startswith(query):
+                break
+            hits.append(self.titles[i])
+        return hits
+
+    def substring_ids(self, query):
+        # While the user keeps typing, the previous matches are a superset of the new ones
+        if self.last_query and query.startswith(self.last_query):
+            candidates = self.last_matches
+        elif len(query) >= 3:
+            postings = [self.trigrams.get(gram) for gram in trigrams(query)]
+            candidates = [] if None in postings else min(postings, key=len)
+        else:
+            candidates = range(len(self.keys))
+        matches = [i for i in candidates if query in self.keys[i]]
+        self.last_query = query
+        self.last_matches = matches
+        return matches
+
+    def search(self, query, limit=10, substring=True):
+        hits = self.prefix(query, limit)
+        if substring and len(hits) < limit:
+            seen = set(hits)
+            for i in self.substring_ids(query.lower()):
+                title = self.titles[i]
+                if title not in seen:
+                    hits.append(title)
+                    seen.add(title)
+                    if len(hits) == limit:
+                        break
+        return hits
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import os
+import struct
+import time
+
+import loudness
+from fragment import SongFragment
+from fragment_cache import FragmentCache
+from library import SongLibrary
+from round_pack import RoundPack
+from rounds import RoundBuilder, RoundQueue
+
+# Every message is a frame: one type byte, a 4-byte length, then the payload
+FRAME = struct.Struct(">BI")
+JSON = 1
+CLIP = 2
+MAX_MESSAGE = 64 * 1024
+
+def encode(kind, payload):
+    if kind == JSON:
+        payload = json.dumps(payload, separators=(",", ":")).encode()
+    return FRAME.pack(kind, len(payload)) + payload
+
+async def read_message(reader, limit=None):
+    kind, length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if limit is not None and length > limit:
+        raise ValueError(f"message of {length} bytes is too large")
+    payload = await reader.readexactly(length)
+    return kind, json.loads(payload) if kind == JSON else payload
+
+class Player:
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.score = 0
+        self.answered = None
+        self.answer_time = 0.0
+
+class SessionServer:
+    # One round stream for every connected client: each round is rendered and encoded once, then the same bytes go to all
+    def __init__(self, library, rounds, round_time=15, pause=3, min_players=1, tolerance=2, max_buffer=4 * 1024 * 1024):
+        self.library = library
+        self.rounds = rounds
+        self.round_time = round_time
+        self.pause = pause
+        self.min_players = min_players
+        self.tolerance = tolerance
+        self.max_buffer = max_buffer
+        self.players = {}
+        self.joined = asyncio.Event()
+        self.number = 0
+        self.current = None
+        self.correct_index = None
+        self.started = 0.0
+        self.next_id = 0
+
+    async def handle(self, reader, writer):
+        self.next_id += 1
+        player_id = self.next_id
+        try:
+            kind, hello = await read_message(reader, MAX_MESSAGE)
+            if kind != JSON or not isinstance(hello, dict) or hello.get("type") != "hello":
+                return
+            player = self.players[player_id] = Player(str(hello.get("name") or f"player {player_id}")[:32], writer)
+            writer.write(encode(JSON, {"type": "welcome", "id": player_id, "players": len(self.players)}))
+            if len(self.players) >= self.min_players:
+                self.joined.set()
+            while True:
+                kind, message = await read_message(reader, MAX_MESSAGE)
+                if kind == JSON and isinstance(message, dict) and message.get("type") == "answer":
+                    self.answer(player, message)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.players.pop(player_id, None)
+            writer.close()
+
+    def answer(self, player, message):
+        # Only the first answer to the running round counts, like a click on one of the four buttons
+        if self.current is None or message.get("round") != self.number or player.answered is not None:
+            return
+        elapsed = time.monotonic() - self.started
+        if "choice" in message:
+            correct = message["choice"] == self.correct_index
+        else:
+            answers = self.library.get_answer_index()
+            correct = answers.is_correct(str(message.get("text", "")), self.current.song.key, self.tolerance)
+        player.answered = correct
+        if correct:
+            player.score += 1
+            player.answer_time += elapsed
+        player.writer.write(encode(JSON, {"type": "ack", "round": self.number, "correct": correct,
+                                          "elapsed_ms": round(elapsed * 1000, 1), "sent": message.get("sent")}))
+
+    def broadcast(self, data):
+        # Clients that stop reading are dropped instead of letting their backlog grow without bound
+        for player_id, player in list(self.players.items()):
+            if player.writer.transport.get_write_buffer_size() > self.max_buffer:
+                print(f"Dropping {player.name}, not keeping up")
+                player.writer.close()
+                self.players.pop(player_id, None)
+                continue
+            player.writer.write(data)
+
+    def scoreboard(self, limit=10):
+        players = sorted(self.players.values(), key=lambda player: (-player.score, player.answer_time))
+        return [{"name": player.name, "score": player.score} for player in players[:limit]]
+
+    async def next_round(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            next_round = await loop.run_in_executor(None, self.rounds.get, 1.0)
+            if next_round is not None:
+                return next_round
+
+    async def run(self):
+        self.rounds.start()
+        while True:
+            if len(self.players) < self.min_players:
+                self.joined.clear()
+                await self.joined.wait()
+            next_round = await self.next_round()
+            self.number += 1
+            self.correct_index = next_round.choices.index(next_round.song.id)
+            for player in self.players.values():
+                player.answered = None
+            header = {"type": "round", "round": self.number, "choices": next_round.labels,
+                      "seconds": self.round_time, "sent": time.time()}
+            data = encode(JSON, header) + encode(CLIP, next_round.fragment)
+            self.current = next_round
+            self.started = time.monotonic()
+            self.broadcast(data)
+            await asyncio.sleep(self.round_time)
+            answered = sum(1 for player in self.players.values() if player.answered is not None)
+            self.current = None
+            self.broadcast(encode(JSON, {"type": "result", "round": self.number, "correct": self.correct_index,
+                                         "title": next_round.song.title, "answered": answered,
+                                         "players": len(self.players), "scores": self.scoreboard()}))
+            await asyncio.sleep(self.pause)
+
+    async def serve(self, host="0.0.0.0", port=8765):
+        # A deep backlog, hundreds of players tend to connect at the same moment
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"Session server listening on {', '.join(str(socket.getsockname()) for socket in server.sockets)}")
+        async with server:
+            await self.run()
+
+def create_rounds(songs_dir, config=None):
+    # Same round pipeline as the window: library, sampler, fragment cache and round pack, prefetched on worker threads
+    config = config or {}
+    library = SongLibrary(songs_dir, workers=config.get("scan_workers"))
+    table = library.scan()
+    if table is None or not len(table):
+        raise SystemExit(f"No valid MP3 files found in {songs_dir}.")
+    SongFragment.cache = FragmentCache(max_bytes=config.get("fragment_cache_mb", 64) * 1024 * 1024)
+    pack_path = config.get("round_pack", "data/rounds.pack")
+    if pack_path and os.path.exists(pack_path):
+        try:
+            SongFragment.pack = RoundPack(pack_path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: round pack '{pack_path}' could not be opened: {e}")
+    if config.get("normalize_loudness", True) and loudness.available():
+        # Levels measured by the game are reused, the server does not measure songs itself
+        SongFragment.normalizer = loudness.Normalizer(config.get("loudness_target", -16.0), config.get("energetic_starts", False))
+        SongFragment.normalizer.load(library.index, library.songs_dir)
+    builder = RoundBuilder(library, 10, config.get("hard_distractors", 0.0))
+    rounds = RoundQueue(builder.build_round, depth=config.get("prefetch_depth", 3), workers=config.get("prefetch_workers", 2))
+    return library, rounds
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a headless game session that many players join over TCP.")
+    parser.add_argument("folder", nargs="?", default="music", help="music folder (default: music)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--round-time", type=float, default=15, help="seconds players get to answer")
+    parser.add_argument("--pause", type=float, default=3, help="seconds between rounds")
+    parser.add_argument("--min-players", type=int, default=1, help="players needed before rounds start")
+    args = parser.parse_args()
+
+    config = {}
+    if os.path.exists("data/config.json"):
+        with open("data/config.json", "r") as f:
+            config = json.load(f)
+    library, rounds = create_rounds(args.folder, config)
+    server = SessionServer(library, rounds, args.round_time, args.pause, args.min_players, config.get("answer_tolerance", 2))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rounds.stop()
+
+if __name__ == "__main__":
+    main()
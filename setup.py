@@ -1,11 +1,20 @@
 import os
 import json
 
-if not os.path.exists("music"):
-    os.mkdir("music")
-
-if not os.path.exists("data/config.json"):
-    with open("data/config.json", "w") as f:
-        json.dump({"volume": 100}, f)
-        
-os.system('python -m spotdl --download-ffmpeg')
\ No newline at end of file
+def create_defaults():
+    if not os.path.exists("music"):
+        os.mkdir("music")
+
+    if not os.path.exists("data/config.json"):
+        with open("data/config.json", "w") as f:
+            json.dump({"volume": 100, "prefetch_depth": 3, "prefetch_workers": 2,
+                       "fragment_cache_mb": 64, "fragment_disk_cache_mb": 0,
+                       "answer_tolerance": 2, "hard_distractors": 0.0, "audio_buffer": 512, "effects_volume": 0.2}, f)
+
+def download_ffmpeg():
+    os.system('python -m spotdl --download-ffmpeg')
+
+# The game only needs the defaults to start, ffmpeg is fetched by the downloader when it is first used
+if __name__ == "__main__":
+    create_defaults()
+    download_ffmpeg()
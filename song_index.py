@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+
+SCHEMA_VERSION = 3
+
+def read_metadata(filepath):
+    # Imported on first use, mutagen is not needed to show the menu
+    from mutagen.mp3 import MP3
+    audio = MP3(filepath)
+    title = audio.get('TIT2', None)
+    album = audio.get('TALB', None)
+    artist = audio.get('TPE1', None)
+    if title is None:
+        title = os.path.basename(filepath).replace(".mp3", "")
+    return (str(title), str(album) if album is not None else None, audio.info.length, audio.info.bitrate,
+            str(artist) if artist is not None else None)
+
+def is_inside(path, folder):
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
+
+class SongIndex:
+    def __init__(self, path="data/library.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self.connection.execute("DROP TABLE IF EXISTS songs")
+                self.connection.execute("DROP TABLE IF EXISTS loudness")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS songs ("
+                "path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, "
+                "title TEXT, album TEXT, duration REAL, bitrate INTEGER, artist TEXT, error TEXT)"
+            )
+            # Analysis results are tied to the file version they were measured on, like the song rows
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS loudness ("
+                "path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, "
+                "loudness REAL, peak REAL, start REAL, error TEXT)"
+            )
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.connection.commit()
+
+    def load(self, songs_dir):
+        songs_dir = os.path.normpath(songs_dir)
+        with self.lock:
+            rows = self.connection.execute("SELECT path, mtime, size, title, album, duration, bitrate, artist, error FROM songs").fetchall()
+        return {row[0]: row for row in rows if is_inside(row[0], songs_dir)}
+
+    def save(self, changed, removed=()):
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", changed)
+            self.connection.executemany("DELETE FROM songs WHERE path = ?", [(path,) for path in removed])
+            self.connection.executemany("DELETE FROM loudness WHERE path = ?", [(path,) for path in removed])
+            self.connection.commit()
+
+    def load_loudness(self, songs_dir):
+        songs_dir = os.path.normpath(songs_dir)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT l.path, l.loudness, l.peak, l.start FROM loudness l JOIN songs s "
+                "ON s.path = l.path AND s.mtime = l.mtime AND s.size = l.size WHERE l.error IS NULL").fetchall()
+        return {row[0]: row[1:] for row in rows if is_inside(row[0], songs_dir)}
+
+    def pending_loudness(self, songs_dir):
+        # Songs without an analysis of their current version, an interrupted run picks up from here
+        songs_dir = os.path.normpath(songs_dir)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT s.path, s.mtime, s.size, s.duration FROM songs s LEFT JOIN loudness l "
+                "ON l.path = s.path AND l.mtime = s.mtime AND l.size = s.size "
+                "WHERE s.error IS NULL AND l.path IS NULL").fetchall()
+        return [row for row in rows if is_inside(row[0], songs_dir)]
+
+    def save_loudness(self, rows):
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+    def update(self, paths, on_error=None):
+        # Revalidates single files reported by the watcher, returns (valid rows, paths that are gone or unreadable)
+        updated = []
+        removed = []
+        changed = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                removed.append(path)
+                continue
+            with self.lock:
+                row = self.connection.execute("SELECT path, mtime, size, title, album, duration, bitrate, artist, error FROM songs WHERE path = ?", (path,)).fetchone()
+            if row is None or row[1] != stat.st_mtime_ns or row[2] != stat.st_size:
+                row = self.parse(path, stat)
+                changed.append(row)
+                if row[8] is not None and on_error:
+                    on_error(os.path.basename(path), row[8])
+            if row[8] is None:
+                updated.append(row[0:1] + row[3:8])
+            else:
+                removed.append(path)
+        self.save(changed, [path for path in removed if not os.path.exists(path)])
+        return updated, removed
+
+    def parse(self, path, stat):
+        try:
+            return (path, stat.st_mtime_ns, stat.st_size) + read_metadata(path) + (None,)
+        except Exception as e:
+            return (path, stat.st_mtime_ns, stat.st_size, None, None, None, None, None, str(e))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
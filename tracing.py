@@ -0,0 +1,133 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Histogram bucket upper bounds in seconds, 10 µs doubling up to about 10 s
+BOUNDS = [0.00001 * 2 ** i for i in range(21)]
+
+enabled = False
+lock = threading.Lock()
+histograms = {}
+counters = {}
+events = deque(maxlen=100000)
+epoch = time.perf_counter()
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BOUNDS, seconds)] += 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction of samples, capped at the slowest one seen
+        wanted = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min(BOUNDS[i], self.max) if i < len(BOUNDS) else self.max
+        return self.max
+
+class Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.started, time.perf_counter())
+        return False
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+def span(name):
+    return Span(name) if enabled else NULL_SPAN
+
+def traced(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, started, finished):
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(finished - started)
+    events.append(("X", name, started, finished - started, threading.get_ident()))
+
+def count(name, amount=1):
+    if not enabled:
+        return
+    with lock:
+        total = counters[name] = counters.get(name, 0) + amount
+    events.append(("C", name, time.perf_counter(), total, threading.get_ident()))
+
+def reset():
+    with lock:
+        histograms.clear()
+        counters.clear()
+        events.clear()
+
+def summary(limit=12):
+    # One line per span, the slowest in total first
+    with lock:
+        spans = sorted(histograms.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+        lines = [f"{name:<22} {h.count:6}x  p50 {h.percentile(0.5) * 1000:7.1f} ms  p99 {h.percentile(0.99) * 1000:7.1f} ms"
+                 for name, h in spans]
+        lines += [f"{name:<22} {value:6}" for name, value in sorted(counters.items())]
+    return "\n".join(lines)
+
+def dump(path):
+    # Chrome trace event format, opens in chrome://tracing or Perfetto
+    pid = os.getpid()
+    trace = []
+    for kind, name, started, value, thread in list(events):
+        event = {"name": name, "ph": kind, "ts": round((started - epoch) * 1e6, 1), "pid": pid, "tid": thread}
+        if kind == "X":
+            event["dur"] = round(value * 1e6, 1)
+        else:
+            event["args"] = {name: value}
+        trace.append(event)
+    with lock:
+        stats = {name: {"count": h.count, "total_ms": h.total * 1000, "max_ms": h.max * 1000,
+                        "p50_ms": h.percentile(0.5) * 1000, "p99_ms": h.percentile(0.99) * 1000}
+                 for name, h in histograms.items()}
+        totals = dict(counters)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms", "otherData": {"spans": stats, "counters": totals}}, f)
@@ -0,0 +1,149 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+class PollingWatcher:
+    def __init__(self, library, interval=5, settle_time=0.5):
+        self.library = library
+        self.interval = interval
+        self.settle_time = settle_time
+        self.folder = None
+        self.running = False
+        self.thread = None
+        self.wakeup = threading.Event()
+
+    def start(self, folder):
+        self.stop()
+        self.folder = folder
+        self.running = True
+        self.wakeup.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def snapshot(self):
+        files = {}
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                if name.endswith(".mp3"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def run(self):
+        previous = self.snapshot()
+        while self.running:
+            self.wakeup.wait(self.interval)
+            if not self.running:
+                break
+            current = self.snapshot()
+            changed = [path for path, stat in current.items() if previous.get(path) != stat]
+            changed += [path for path in previous if path not in current]
+            previous = current
+            if changed:
+                self.library.apply_changes(changed)
+
+class InotifyWatcher(PollingWatcher):
+    def __init__(self, library, settle_time=0.5):
+        super().__init__(library, settle_time=settle_time)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = None
+        self.watches = {}
+
+    def add_watches(self, folder):
+        for root, _, _ in os.walk(folder):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = root
+
+    def run(self):
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            print("Warning: inotify is not available, falling back to polling.")
+            return PollingWatcher.run(self)
+        self.watches = {}
+        self.add_watches(self.folder)
+        pending = set()
+        last_event = 0
+        try:
+            while self.running:
+                ready, _, _ = select.select([self.fd], [], [], self.settle_time)
+                if ready:
+                    pending.update(self.read_events())
+                    last_event = time.monotonic()
+                # Wait until the folder is quiet so half-copied files are not parsed
+                if pending and time.monotonic() - last_event >= self.settle_time:
+                    if None in pending:
+                        self.library.scan()
+                    else:
+                        self.library.apply_changes(pending)
+                    pending = set()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+    def read_events(self):
+        paths = []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return paths
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                paths.append(None)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            folder = self.watches.get(wd)
+            if folder is None:
+                continue
+            path = os.path.join(folder, name) if name else folder
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_watches(path)
+            paths.append(path)
+        return paths
+
+def create_watcher(library):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(library)
+        except OSError:
+            pass
+    return PollingWatcher(library)